@@ -1,17 +1,30 @@
+import base64
+import binascii
+import json
 import shutil
-from flask import Flask, jsonify, request, send_file
+from datetime import datetime
+from flask import Flask, Response, g, jsonify, request, send_file
+from flask.helpers import get_debug_flag
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import uuid
-import io
-import zipfile
+import itertools
+import time
 import yagmail
-from database.dbhandler import hash_file
-from src.redaction_service import process_pdf_redaction
-from src.ocr_redaction import ocr_from_pdf
-from src.ollamahandler import OllamaClient
-from database.models import get_db, Document
+from werkzeug.serving import is_running_from_reloader
+from src.redaction_service import iter_pdf_redaction
+from src.content_store import ContentStore, save_stream
+from src.zip_stream import stream_zip
+from src.structured_service import process_structured_documents
+from src.jobs import JobManager, JobQueueFull, redact_job, structured_job
+from src.model import load_analyzer
+from src import metrics
+from src.config import (ANALYZER_PRELOAD, ANALYZER_WARMUP, DETECTION_MODE,
+                        JOB_WORKERS, JOB_MAX_PENDING, JOB_STORAGE_FOLDER,
+                        DOCUMENTS_PAGE_SIZE, DOCUMENTS_MAX_PAGE_SIZE)
+from sqlalchemy import tuple_
+from database.models import db_session, Document
 
 app = Flask(__name__)
 # Configure CORS with more specific settings
@@ -19,7 +32,8 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Credentials"]
+        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Credentials"],
+        "expose_headers": ["X-Next-Cursor"]
     }
 })
 
@@ -29,6 +43,85 @@ ALLOWED_EXTENSIONS = {'pdf'}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(STORAGE_FOLDER, exist_ok=True)
 
+# python app.py runs the development server with the debugger and reloader
+DEBUG = True
+
+
+def is_reloader_parent():
+    """
+    True in the process that only runs the debug reloader; the child it
+    starts (and restarts on changes) is the one that serves requests
+    """
+    if is_running_from_reloader():
+        return False
+    if __name__ == '__main__':
+        return DEBUG
+    # flask run --debug
+    return os.environ.get('FLASK_RUN_FROM_CLI') == 'true' and get_debug_flag()
+
+
+# Uploads are stored once per distinct content; each document path is a
+# hard link to the shared copy
+content_store = ContentStore(STORAGE_FOLDER)
+
+# Background jobs for large batches, run on a local thread pool
+job_manager = JobManager(JOB_STORAGE_FOLDER, max_workers=JOB_WORKERS,
+                         max_pending=JOB_MAX_PENDING)
+job_manager.register('redact', redact_job(job_manager))
+job_manager.register('structured', structured_job)
+
+# Startup work is done only by processes that serve requests
+if not is_reloader_parent():
+    # Drop objects whose last path went away without release() (e.g. a
+    # crash between removing the path and the object)
+    content_store.collect_garbage()
+
+    # Load the shared PII analyzer once instead of on the first request
+    # (regex-only detection never uses it)
+    if ANALYZER_PRELOAD and DETECTION_MODE != "regex":
+        load_analyzer(warm_up=ANALYZER_WARMUP)
+
+    # Pick up jobs left queued, or running in a process that is gone
+    # (every worker process may do this; see JobManager.recover)
+    job_manager.recover()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_endpoint = request.endpoint or 'unknown'
+    metrics.HTTP_IN_FLIGHT.inc(endpoint=g.request_endpoint)
+
+
+@app.after_request
+def record_request_time(response):
+    if 'request_start' in g:
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            endpoint=g.request_endpoint,
+            method=request.method,
+            status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request(exc):
+    if 'request_endpoint' in g:
+        metrics.HTTP_IN_FLIGHT.dec(endpoint=g.request_endpoint)
+
+
+@app.teardown_appcontext
+def remove_db_session(exc):
+    # Roll back anything uncommitted and return the connection to the pool
+    db_session.remove()
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text exposition format
+    return Response(metrics.render(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -123,21 +216,14 @@ def add_document():
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(temp_path)
-
-        # Create storage path - using UUID since hash will be added later
-        file_id = str(uuid.uuid4())
-        storage_filename = f"{file_id}_{filename}"
-        storage_path = os.path.join(STORAGE_FOLDER, storage_filename)
 
-        # Move file to permanent storage
-        shutil.move(temp_path, storage_path)
+        # Hash the upload while saving it; identical bytes are stored once
+        storage_path, content_hash, duplicate = content_store.add(
+            file.stream, filename)
 
         # Save to database with NULL hash initially
+        db = db_session()
         try:
-            db = next(get_db())
-
             # Check if document with this path already exists
             existing_doc = db.query(Document).filter(
                 Document.path == storage_path).first()
@@ -149,7 +235,8 @@ def add_document():
             new_document = Document(
                 path=storage_path,
                 email=email,
-                hash=None  # Hash will be updated after structured data processing
+                hash=None,  # Hash will be updated after structured data processing
+                content_hash=content_hash
             )
 
             db.add(new_document)
@@ -158,59 +245,123 @@ def add_document():
             return jsonify({
                 'message': 'Document added successfully',
                 'path': storage_path,
-                'email': email
+                'email': email,
+                'content_hash': content_hash,
+                'duplicate': duplicate
             })
 
         except Exception as e:
             db.rollback()
             # Clean up file if database operation failed
-            if os.path.exists(storage_path):
-                os.remove(storage_path)
+            content_store.release(storage_path, content_hash)
             return jsonify({'error': f'Error adding document to database: {str(e)}'}), 500
-        finally:
-            db.close()
 
     return jsonify({'error': 'Invalid file type'}), 400
 
 
+# Fields /documents can return: name -> (columns read, value of a row)
+DOCUMENT_FIELDS = {
+    'path': ((Document.path,), lambda row: row.path),
+    'email': ((Document.email,), lambda row: row.email),
+    'hash': ((Document.hash,), lambda row: row.hash),
+    'content_hash': ((Document.content_hash,), lambda row: row.content_hash),
+    'created_at': ((Document.created_at,),
+                   lambda row: row.created_at.isoformat()),
+    'filename': ((Document.path,), lambda row: os.path.basename(row.path)),
+    # Flag to indicate if document has been processed
+    'processed': ((Document.hash,), lambda row: row.hash is not None),
+}
+DEFAULT_DOCUMENT_FIELDS = ['path', 'email', 'hash', 'filename', 'processed']
+
+
+def encode_cursor(created_at, path):
+    """Opaque /documents cursor for the position after (created_at, path)"""
+    raw = json.dumps([created_at.isoformat(), path]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, path = json.loads(raw)
+        return datetime.fromisoformat(created_at), path
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 @app.route('/documents', methods=['GET'])
 def get_documents():
+    # Keyset pagination in upload order: ?limit=N returns up to N documents
+    # and, if there are more, an X-Next-Cursor header to pass back as
+    # ?cursor=. Without ?limit= or ?cursor= every document is returned.
+    # ?fields=path,hash,... selects the fields returned.
     email_filter = request.args.get('email')
 
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else DEFAULT_DOCUMENT_FIELDS
+    unknown = [field for field in fields if field not in DOCUMENT_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    if limit is not None or cursor:
+        try:
+            limit = int(limit) if limit is not None else DOCUMENTS_PAGE_SIZE
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        limit = min(max(limit, 1), DOCUMENTS_MAX_PAGE_SIZE)
+
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    # Only the selected columns are read, plus the sort key
+    columns = {Document.created_at: None, Document.path: None}
+    for field in fields:
+        columns.update(dict.fromkeys(DOCUMENT_FIELDS[field][0]))
+
     try:
-        db = next(get_db())
-        query = db.query(Document)
+        db = db_session()
+        query = db.query(*columns)
 
         # Filter by email if provided
         if email_filter:
             query = query.filter(Document.email == email_filter)
+        if cursor:
+            query = query.filter(
+                tuple_(Document.created_at, Document.path) > tuple_(*after))
 
-        documents = query.all()
-
-        result = []
-        for doc in documents:
-            result.append({
-                'path': doc.path,
-                'email': doc.email,
-                'hash': doc.hash,
-                'filename': os.path.basename(doc.path),
-                # Flag to indicate if document has been processed
-                'processed': doc.hash is not None
-            })
+        query = query.order_by(Document.created_at, Document.path)
+        if limit is None:
+            rows = query.all()
+        else:
+            # One extra row tells whether there is a next page
+            rows = query.limit(limit + 1).all()
+
+        result = [{field: DOCUMENT_FIELDS[field][1](row) for field in fields}
+                  for row in rows[:limit]]
 
-        return jsonify(result)
+        response = jsonify(result)
+        if limit is not None and len(rows) > limit:
+            last = rows[limit - 1]
+            response.headers['X-Next-Cursor'] = encode_cursor(
+                last.created_at, last.path)
+        return response
 
     except Exception as e:
         return jsonify({'error': f'Error fetching documents: {str(e)}'}), 500
-    finally:
-        db.close()
 
 
 @app.route('/document/hash/<hash>', methods=['GET'])
 def get_document_by_hash(hash):
     try:
-        db = next(get_db())
-        document = db.query(Document).filter(Document.hash == hash).first()
+        db = db_session()
+        document = db.query(Document.path).filter(
+            Document.hash == hash).first()
 
         if not document:
             return jsonify({'error': 'Document not found'}), 404
@@ -224,8 +375,6 @@ def get_document_by_hash(hash):
 
     except Exception as e:
         return jsonify({'error': f'Error fetching document: {str(e)}'}), 500
-    finally:
-        db.close()
 
 
 @app.route('/structured', methods=['POST'])
@@ -247,47 +396,8 @@ def structured_data():
     os.makedirs(session_folder, exist_ok=True)
 
     try:
-        client = OllamaClient()
-        results = []
-        db = next(get_db())
-
-        for doc_path in document_paths:
-            # Get document from database
-            document = db.query(Document).filter(
-                Document.path == doc_path).first()
-
-            if not document:
-                results.append({
-                    'error': f'Document with path {doc_path} not found',
-                    'path': doc_path
-                })
-                continue
-
-            if not os.path.exists(doc_path):
-                results.append({
-                    'error': f'File not found at path {doc_path}',
-                    'path': doc_path
-                })
-                continue
-
-            # Process document to get structured data
-            text = ocr_from_pdf(doc_path)
-            structured_result = client.get_structured_data(text)
-
-            # Calculate hash for the structured data
-            doc_hash = hash_file(structured_result)
-
-            # Update document in database with hash
-            document.hash = doc_hash
-
-            # Add document info to results
-            results.append({
-                'structured_data': structured_result,
-                'hash': doc_hash,
-                'path': doc_path,
-                'filename': os.path.basename(doc_path),
-                'email': document.email
-            })
+        db = db_session()
+        results = process_structured_documents(document_paths, db)
 
         # Commit all database changes
         db.commit()
@@ -300,8 +410,7 @@ def structured_data():
 
     except Exception as e:
         # Rollback database changes on error
-        if 'db' in locals():
-            db.rollback()
+        db_session.rollback()
 
         # Clean up temporary session folder
         if os.path.exists(session_folder):
@@ -309,10 +418,6 @@ def structured_data():
 
         return jsonify({'error': f'Error processing documents: {str(e)}'}), 500
 
-    finally:
-        if 'db' in locals():
-            db.close()
-
 
 @app.route('/redact', methods=['POST'])
 def redact_pdfs():
@@ -336,54 +441,179 @@ def redact_pdfs():
 
         # Process uploaded files
         uploaded_paths = []
+        content_hashes = []
         for file in files:
             if file and file.filename:
                 filename = secure_filename(file.filename)
                 file_path = os.path.join(session_folder, filename)
-                file.save(file_path)
+                # Hashed while saving; repeat uploads come from the
+                # redaction cache
+                content_hash, _ = save_stream(file.stream, file_path)
                 uploaded_paths.append(file_path)
+                content_hashes.append(content_hash)
 
         if not uploaded_paths:
             return jsonify({'error': 'No valid files uploaded'}), 400
 
-        # Process the batch of PDFs
-        output_paths = process_pdf_redaction(
-            uploaded_paths, session_folder, method, replace_text)
+        # Redact lazily; each PDF is streamed into the ZIP as soon as it is
+        # done. The first file is redacted up front so that early failures
+        # still get a JSON error response.
+        outputs = iter_pdf_redaction(
+            uploaded_paths, session_folder, method, replace_text,
+            content_hashes=content_hashes)
+        first_output = next(outputs)
+
+    except Exception as e:
+        # Clean up on error
+        if os.path.exists(session_folder):
+            shutil.rmtree(session_folder)
+        return jsonify({'error': f'Error processing files: {str(e)}'}), 500
+
+    def generate():
+        try:
+            yield from stream_zip(itertools.chain([first_output], outputs),
+                                  on_added=os.remove)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated archive
+            print(f"Error streaming redacted files: {str(e)}")
+            raise
+        finally:
+            # Clean up temporary files
+            if os.path.exists(session_folder):
+                shutil.rmtree(session_folder)
+
+    return Response(
+        generate(),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition':
+                f'attachment; filename=redacted_pdfs_{session_id}.zip'
+        }
+    )
+
+
+@app.route('/jobs/redact', methods=['POST'])
+def submit_redact_job():
+    # Same form fields as /redact, but returns a job id right away
+    method = request.form.get('method', 'full_redact')
+    replace_text = request.form.get('replace_text', '[REDACTED]')
+
+    if 'files' not in request.files:
+        return jsonify({'error': 'No files part in the request'}), 400
+
+    files = request.files.getlist('files')
+    if not files or len(files) == 0:
+        return jsonify({'error': 'No files selected'}), 400
+
+    job_id = job_manager.new_job_id()
+    input_folder = os.path.join(job_manager.job_folder(job_id), 'input')
+    os.makedirs(input_folder, exist_ok=True)
+
+    try:
+        filenames = []
+        for file in files:
+            if file and file.filename:
+                filename = secure_filename(file.filename)
+                file.save(os.path.join(input_folder, filename))
+                filenames.append(filename)
+
+        if not filenames:
+            shutil.rmtree(job_manager.job_folder(job_id))
+            return jsonify({'error': 'No valid files uploaded'}), 400
+
+        job_manager.submit('redact', {
+            'method': method,
+            'replace_text': replace_text,
+            'files': filenames
+        }, filenames, job_id=job_id)
 
-        # Create a ZIP file with all redacted PDFs
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w') as zf:
-            for output_path in output_paths:
-                arcname = os.path.basename(output_path)
-                zf.write(output_path, arcname)
+    except JobQueueFull as e:
+        shutil.rmtree(job_manager.job_folder(job_id), ignore_errors=True)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        shutil.rmtree(job_manager.job_folder(job_id), ignore_errors=True)
+        return jsonify({'error': f'Error submitting job: {str(e)}'}), 500
 
-        memory_file.seek(0)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/jobs/{job_id}'
+    }), 202
 
-        # Clean up temporary files
-        for file_path in uploaded_paths:
-            if os.path.exists(file_path):
-                os.remove(file_path)
 
-        for output_path in output_paths:
-            if os.path.exists(output_path):
-                os.remove(output_path)
+@app.route('/jobs/structured', methods=['POST'])
+def submit_structured_job():
+    # Same JSON body as /structured, but returns a job id right away
+    if not request.json or 'document_paths' not in request.json:
+        return jsonify({'error': 'No document paths provided'}), 400
 
-        if os.path.exists(session_folder):
-            shutil.rmtree(session_folder)
+    document_paths = request.json['document_paths']
 
+    if not document_paths:
+        return jsonify({'error': 'Empty document path list'}), 400
+
+    try:
+        job_id = job_manager.submit(
+            'structured',
+            {'document_paths': document_paths},
+            [os.path.basename(path) for path in document_paths])
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'Error submitting job: {str(e)}'}), 500
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/jobs/{job_id}'
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    try:
+        job = job_manager.get(job_id)
+    except Exception as e:
+        return jsonify({'error': f'Error fetching job: {str(e)}'}), 500
+
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    # Results are fetched from /jobs/<id>/result
+    job.pop('result', None)
+    job.pop('result_path', None)
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    try:
+        job = job_manager.get(job_id)
+    except Exception as e:
+        return jsonify({'error': f'Error fetching job: {str(e)}'}), 500
+
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'status': job['status']}), 500
+
+    if job['status'] != 'completed':
+        return jsonify({'error': 'Job has not finished',
+                        'status': job['status']}), 409
+
+    if job['result_path']:
+        if not os.path.exists(job['result_path']):
+            return jsonify({'error': 'Job result is no longer available'}), 410
         return send_file(
-            memory_file,
+            os.path.abspath(job['result_path']),
             mimetype='application/zip',
             as_attachment=True,
-            download_name=f'redacted_pdfs_{session_id}.zip'
+            download_name=os.path.basename(job['result_path'])
         )
 
-    except Exception as e:
-        # Clean up on error
-        if os.path.exists(session_folder):
-            shutil.rmtree(session_folder)
-        return jsonify({'error': f'Error processing files: {str(e)}'}), 500
+    return jsonify(job['result'])
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
\ No newline at end of file
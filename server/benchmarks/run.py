@@ -0,0 +1,475 @@
+# run.py
+"""
+Benchmark the redaction pipeline.
+
+Run from the server directory:
+
+    python -m benchmarks.run --pages 20 50 --output results.json
+    python -m benchmarks.run --output new.json --baseline results.json
+
+Every input (server/assets PDFs plus generated synthetic PDFs) goes through
+each stage in turn. For every stage the wall time, pages/sec, Tesseract call
+count and peak RSS so far are recorded. A stage that fails (e.g. no spaCy
+model installed) records its error and the run carries on.
+
+Model calls go to StubOllama, so the run needs no Ollama server.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+import fitz
+
+from benchmarks.synthetic import make_synthetic_pdf
+from src import config
+from src import metrics
+from src import ocr_engine
+from src import ocr_redaction
+from src.model import analyze_text_from_string
+from src.ocr_redaction import (print_contents, ocr_from_pdf, legal_redact_pdf,
+                               extract_document)
+from src.ollamahandler import OllamaClient
+from src import redaction_service
+from src.redaction_service import process_pdf_redaction
+from src.term_matcher import normalize_term
+
+logger = logging.getLogger("benchmarks")
+
+ASSETS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "assets")
+ASSET_FILES = ["t1.pdf", "test2.pdf"]
+
+SAVE_STAGES = {f"save_{profile}": profile
+               for profile in ocr_redaction.SAVE_PROFILES}
+STAGES = ["print_contents", "analyze_text_from_string", "legal_redact_pdf",
+          *SAVE_STAGES, "process_pdf_redaction", "ocr_from_pdf", "structured"]
+
+# Fallback PII terms for legal_redact_pdf when the analyzer is unavailable
+_FALLBACK_PII = re.compile(
+    r"[\w.+-]+@[\w-]+\.\w+|\b\d{4} \d{4} \d{4}\b|\+91 \d{5} \d{5}")
+
+
+class TesseractCounter:
+    """
+    Wraps the process-wide OCR engine to count the Tesseract calls made in
+    this process, whatever the backend
+    """
+
+    def __init__(self, stub=False):
+        self.calls = 0
+        self.stub = stub
+        self._lock = threading.Lock()
+        self._inner = None
+
+    @property
+    def name(self):
+        return "stub" if self.stub else self._inner.name
+
+    def install(self):
+        self._inner = None if self.stub else ocr_engine.get_engine()
+        ocr_engine._engine = self
+
+    def uninstall(self):
+        ocr_engine._engine = self._inner
+
+    def _call(self, name, image, config):
+        with self._lock:
+            self.calls += 1
+        if self.stub:
+            return _stub_ocr(name)
+        return getattr(self._inner, name)(image, config=config)
+
+    def image_to_string(self, image, config=""):
+        return self._call("image_to_string", image, config)
+
+    def image_to_data(self, image, config=""):
+        return self._call("image_to_data", image, config)
+
+    def close(self):
+        pass
+
+
+def _stub_ocr(name):
+    """Canned Tesseract output, for machines without the binary"""
+    if name == "image_to_string":
+        return "Patient John Smith\nAadhaar 1234 5678 9012\n"
+    return {
+        'level': [5] * 5, 'page_num': [1] * 5, 'block_num': [1] * 5,
+        'par_num': [1] * 5, 'line_num': [1, 1, 2, 2, 2],
+        'word_num': [1, 2, 1, 2, 3],
+        'left': [20, 140, 20, 160, 240], 'top': [40, 40, 90, 90, 90],
+        'width': [110, 100, 130, 70, 70], 'height': [30] * 5,
+        'conf': [90] * 5,
+        'text': ['John', 'Smith', 'Aadhaar', '1234', '5678'],
+    }
+
+
+class StubOllama:
+    """
+    Offline stand-in for ollama.Client.chat that streams a canned JSON
+    answer after a fixed latency
+    """
+
+    RESPONSE = json.dumps({
+        "name": "John Smith",
+        "aadhaar": "1234 5678 9012",
+        "diagnosis": "Routine check-up",
+        "medications": [],
+    })
+
+    def __init__(self, latency=0.05, chunk_size=4):
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        time.sleep(self.latency)
+        text = self.RESPONSE
+        chunks = [text[i:i + self.chunk_size]
+                  for i in range(0, len(text), self.chunk_size)]
+        final = {
+            'message': {'content': ''},
+            'done': True,
+            'prompt_eval_count': sum(len(m['content']) for m in messages) // 4,
+            'eval_count': len(chunks),
+            'eval_duration': int(self.latency * 1e9),
+        }
+        if not stream:
+            final['message']['content'] = text
+            return final
+        return _StubStream(chunks, final)
+
+
+class _StubStream:
+    def __init__(self, chunks, final):
+        self.chunks = chunks
+        self.final = final
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield {'message': {'content': chunk}, 'done': False}
+        yield self.final
+
+    def close(self):
+        pass
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its reaped children"""
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) * unit / (1024 * 1024), 1)
+
+
+def _page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def find_leaks(pdf_bytes, terms):
+    """
+    Redacted terms still recoverable from a PDF: in the extracted page
+    text, or as raw bytes in any object or decoded stream of the file
+    (e.g. an old content stream a save kept around).
+    """
+    terms = {normalize_term(term) for term in terms if term.strip()}
+    with fitz.open("pdf", pdf_bytes) as doc:
+        text = normalize_term(" ".join(page.get_text() for page in doc))
+        raw = []
+        for xref in range(1, doc.xref_length()):
+            raw.append(doc.xref_object(xref, compressed=True).encode())
+            if doc.xref_is_stream(xref):
+                raw.append(doc.xref_stream(xref) or b"")
+    raw = normalize_term(b"\n".join(raw).decode("latin-1"))
+
+    return sorted(term for term in terms if term in text or term in raw)
+
+
+class Benchmark:
+    def __init__(self, args, counter, work_folder):
+        self.args = args
+        self.counter = counter
+        self.work_folder = work_folder
+        self.client = OllamaClient(concurrency=args.ollama_concurrency)
+        self.client.client = StubOllama(latency=args.ollama_latency)
+
+    def time_stage(self, name, pages, func):
+        """Run func args.repeat times and record the best run"""
+        runs = []
+        value = None
+        calls_before = self.counter.calls
+        entry = {}
+
+        for _ in range(self.args.repeat):
+            start = time.perf_counter()
+            try:
+                value = func()
+            except Exception as e:
+                logger.debug(traceback.format_exc())
+                entry["error"] = f"{type(e).__name__}: {e}"
+                break
+            runs.append(time.perf_counter() - start)
+
+        if runs:
+            best = min(runs)
+            entry.update({
+                "seconds": round(best, 4),
+                "runs": [round(r, 4) for r in runs],
+                "pages_per_sec": round(pages / best, 2) if best else None,
+            })
+        # Calls made in worker processes are not visible from here
+        entry["tesseract_calls"] = (
+            (self.counter.calls - calls_before) // max(len(runs), 1)
+            if self.args.workers == 1 else None)
+        entry["peak_rss_mb"] = peak_rss_mb()
+
+        status = entry.get("error") or f"{entry['seconds']:.3f}s"
+        logger.info(f"  {name:<26} {status}")
+        return entry, value
+
+    def redact_to_bytes(self, path, pii_terms, profile):
+        """legal_redact_pdf with a save profile; returns the output bytes"""
+        if profile == "stream":
+            output = io.BytesIO()
+            legal_redact_pdf(path, output, pii_terms=pii_terms,
+                             workers=self.args.workers, profile=profile)
+            return output.getvalue()
+
+        output_path = os.path.join(self.work_folder, f"save_{profile}.pdf")
+        legal_redact_pdf(path, output_path, pii_terms=pii_terms,
+                         workers=self.args.workers, profile=profile)
+        with open(output_path, "rb") as f:
+            return f.read()
+
+    def run_input(self, path):
+        name = os.path.basename(path)
+        file_id = os.path.splitext(name)[0]
+        pages = _page_count(path)
+        workers = self.args.workers
+        stages = {}
+        logger.info(f"{name} ({pages} pages)")
+
+        text_path = os.path.join(self.work_folder, f"{file_id}.txt")
+        output_path = os.path.join(self.work_folder, f"{file_id}_redacted.pdf")
+        output_folder = os.path.join(self.work_folder, f"{file_id}_batch")
+        os.makedirs(output_folder, exist_ok=True)
+
+        document = None
+        pii_terms = None
+        pii_source = None
+
+        if "print_contents" in self.args.stages:
+            stages["print_contents"], document = self.time_stage(
+                "print_contents", pages,
+                lambda: print_contents(path, text_path, workers=workers))
+
+        if document is None:
+            document = extract_document(path, workers=workers)
+
+        if "analyze_text_from_string" in self.args.stages:
+            stages["analyze_text_from_string"], pii_terms = self.time_stage(
+                "analyze_text_from_string", pages,
+                lambda: analyze_text_from_string(document.text))
+            pii_source = "analyzer"
+
+        if pii_terms is None:
+            pii_terms = sorted(set(_FALLBACK_PII.findall(document.text)))
+            pii_source = "regex_fallback"
+
+        if "legal_redact_pdf" in self.args.stages:
+            stages["legal_redact_pdf"], _ = self.time_stage(
+                "legal_redact_pdf", pages,
+                lambda: legal_redact_pdf(path, output_path,
+                                         pii_terms=pii_terms,
+                                         workers=workers))
+
+        # Same redaction saved with each output profile; the leak check
+        # runs outside the timed call
+        for stage_name, profile in SAVE_STAGES.items():
+            if stage_name not in self.args.stages:
+                continue
+            save_before = (metrics.STAGE_SECONDS.total(stage="save_pdf"),
+                           metrics.STAGE_SECONDS.count(stage="save_pdf"))
+            stages[stage_name], pdf_bytes = self.time_stage(
+                stage_name, pages,
+                lambda: self.redact_to_bytes(path, pii_terms, profile))
+            if pdf_bytes is not None:
+                saves = (metrics.STAGE_SECONDS.count(stage="save_pdf")
+                         - save_before[1])
+                stages[stage_name]["save_seconds"] = round(
+                    (metrics.STAGE_SECONDS.total(stage="save_pdf")
+                     - save_before[0]) / max(saves, 1), 4)
+                stages[stage_name]["output_bytes"] = len(pdf_bytes)
+                stages[stage_name]["leaked_terms"] = len(
+                    find_leaks(pdf_bytes, pii_terms))
+
+        if "process_pdf_redaction" in self.args.stages:
+            stages["process_pdf_redaction"], _ = self.time_stage(
+                "process_pdf_redaction", pages,
+                lambda: process_pdf_redaction([path], output_folder))
+
+        ocr_text = None
+        if "ocr_from_pdf" in self.args.stages:
+            stages["ocr_from_pdf"], ocr_text = self.time_stage(
+                "ocr_from_pdf", pages, lambda: ocr_from_pdf(path))
+
+        if "structured" in self.args.stages:
+            text = ocr_text if ocr_text is not None else document.text
+            stages["structured"], _ = self.time_stage(
+                "structured", pages,
+                lambda: self.client.get_structured_data(text))
+
+        return {
+            "input": name,
+            "pages": pages,
+            "bytes": os.path.getsize(path),
+            "pii_terms": len(pii_terms),
+            "pii_terms_source": pii_source,
+            "stages": stages,
+        }
+
+
+def collect_inputs(args, work_folder):
+    inputs = []
+    if not args.no_assets:
+        for name in ASSET_FILES:
+            path = os.path.join(ASSETS_FOLDER, name)
+            if os.path.exists(path):
+                inputs.append(path)
+            else:
+                logger.warning(f"Asset not found: {path}")
+
+    for pages in args.pages:
+        path = os.path.join(work_folder, f"synthetic_{pages}p.pdf")
+        make_synthetic_pdf(path, pages=pages, image_every=args.image_every,
+                           seed=args.seed)
+        inputs.append(path)
+
+    inputs.extend(args.inputs)
+    return inputs
+
+
+def compare(results, baseline):
+    """Print stage timings next to a baseline run"""
+    previous = {
+        (item["input"], stage): entry.get("seconds")
+        for item in baseline["results"]
+        for stage, entry in item["stages"].items()
+    }
+
+    print(f"\n{'input':<24} {'stage':<26} {'base s':>9} {'new s':>9} {'change':>8}")
+    for item in results["results"]:
+        for stage, entry in item["stages"].items():
+            old = previous.get((item["input"], stage))
+            new = entry.get("seconds")
+            if old is None or new is None:
+                change = "n/a"
+            else:
+                change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{item['input']:<24} {stage:<26} "
+                  f"{old if old is not None else '-':>9} "
+                  f"{new if new is not None else '-':>9} {change:>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="*", default=[20],
+                        help="Page counts of the synthetic PDFs to generate")
+    parser.add_argument("--image-every", type=int, default=2,
+                        help="Put a scanned image on every n-th synthetic page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--inputs", nargs="*", default=[],
+                        help="Additional PDFs to benchmark")
+    parser.add_argument("--no-assets", action="store_true",
+                        help="Skip the PDFs in server/assets")
+    parser.add_argument("--stages", nargs="*", default=STAGES,
+                        choices=STAGES)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes per PDF (Tesseract calls are "
+                             "only counted with 1)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per stage; the fastest is reported")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the OCR and redaction caches enabled")
+    parser.add_argument("--stub-ocr", action="store_true",
+                        help="Replace Tesseract with canned output")
+    parser.add_argument("--ollama-latency", type=float, default=0.05,
+                        help="Seconds the Ollama stand-in waits per request")
+    parser.add_argument("--ollama-concurrency", type=int,
+                        default=config.OLLAMA_CONCURRENCY)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep generated and redacted files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # src.ollamahandler configures DEBUG logging on import
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    logging.getLogger("src").setLevel(logging.WARNING)
+
+    # Measure the work itself, not cache hits from earlier runs
+    if not args.cache:
+        ocr_redaction.ocr_cache.enabled = False
+        redaction_service.redaction_cache.enabled = False
+
+    counter = TesseractCounter(stub=args.stub_ocr)
+    counter.install()
+    work_folder = tempfile.mkdtemp(prefix="redaction_bench_")
+
+    try:
+        benchmark = Benchmark(args, counter, work_folder)
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "pymupdf": fitz.VersionBind,
+                "workers": args.workers,
+                "repeat": args.repeat,
+                "ocr_cache": args.cache,
+                "ocr_backend": counter.name,
+                "ollama_latency": args.ollama_latency,
+            },
+            "results": [benchmark.run_input(path)
+                        for path in collect_inputs(args, work_folder)],
+        }
+        results["meta"]["peak_rss_mb"] = peak_rss_mb()
+        results["meta"]["tesseract_calls"] = counter.calls
+        results["meta"]["ollama"] = dict(benchmark.client.stats)
+    finally:
+        counter.uninstall()
+        if args.keep:
+            logger.info(f"Files kept in {work_folder}")
+        else:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
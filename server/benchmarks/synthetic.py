@@ -0,0 +1,98 @@
+# synthetic.py
+import random
+import cv2
+import fitz
+import numpy as np
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha",
+               "John", "Maria", "David", "Fatima", "Arjun", "Kavya"]
+LAST_NAMES = ["Sharma", "Iyer", "Patel", "Reddy", "Smith", "Garcia",
+              "Nair", "Khan", "Menon", "Gupta", "Das", "Rao"]
+CITIES = ["Bengaluru", "Mumbai", "Chennai", "Hyderabad", "Pune", "Delhi"]
+
+
+def _person(rng):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    return {
+        "name": f"{first} {last}",
+        "email": f"{first.lower()}.{last.lower()}{rng.randint(1, 99)}@example.com",
+        "phone": f"+91 {rng.randint(70000, 99999)} {rng.randint(10000, 99999)}",
+        "aadhaar": f"{rng.randint(2000, 9999)} {rng.randint(1000, 9999)} {rng.randint(1000, 9999)}",
+        "city": rng.choice(CITIES),
+    }
+
+
+def _text_lines(rng, count):
+    """Lines of filler text with a dense sprinkling of PII"""
+    lines = []
+    for _ in range(count):
+        person = _person(rng)
+        lines.append(rng.choice([
+            f"Patient {person['name']} was admitted in {person['city']}.",
+            f"Contact {person['name']} at {person['email']} or {person['phone']}.",
+            f"Aadhaar number {person['aadhaar']} belongs to {person['name']}.",
+            "The attending physician reviewed the report with the family.",
+            "Follow-up visit scheduled after the next lab results.",
+        ]))
+    return lines
+
+
+def _scanned_image(rng, lines, width=1200, line_height=48):
+    """Render lines of text into a noisy grayscale PNG, like a scanned page"""
+    height = line_height * (len(lines) + 2)
+    img = np.full((height, width), 245, np.uint8)
+    noise = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).integers(
+        0, 12, img.shape, dtype=np.uint8)
+    img -= noise
+
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (30, line_height * (i + 1) + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, 20, 2)
+
+    ok, png = cv2.imencode('.png', img)
+    if not ok:
+        raise RuntimeError("Failed to encode synthetic image")
+    return png.tobytes()
+
+
+def make_synthetic_pdf(path, pages=20, image_every=2, lines_per_page=30,
+                       seed=0):
+    """
+    Write a PDF with a text layer full of PII on every page and a scanned
+    looking image on every image_every-th page.
+
+    Parameters:
+        path: Output PDF path
+        pages: Number of pages
+        image_every: Put an image on every n-th page (0 for text only)
+        lines_per_page: Lines of text-layer content per page
+        seed: Random seed, so runs generate the same document
+
+    Returns:
+        Dict describing the generated document
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    image_count = 0
+
+    for page_num in range(pages):
+        page = doc.new_page()
+        has_image = image_every and page_num % image_every == 0
+        lines = _text_lines(rng, lines_per_page // 2 if has_image else lines_per_page)
+
+        y = 60
+        for line in lines:
+            page.insert_text((50, y), line, fontsize=10)
+            y += 14
+
+        if has_image:
+            png = _scanned_image(rng, _text_lines(rng, 8))
+            page.insert_image(fitz.Rect(50, y + 10, 560, y + 260), stream=png)
+            image_count += 1
+
+    doc.save(path, garbage=4, deflate=True)
+    doc.close()
+
+    return {"path": path, "pages": pages, "images": image_count,
+            "seed": seed}
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from sqlalchemy import (Column, Integer, MetaData, String, Table, DateTime,
+                        inspect, select, update)
+
+# Schema version of every database, one row per applied migration
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime(timezone=True), nullable=False),
+)
+
+
+def _add_column(conn, table, name):
+    """Add a column declared on table to the database if it is missing"""
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    if name in existing:
+        return False
+    column = table.columns[name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(
+        f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}')
+    return True
+
+
+def _create_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _documents_v1(conn, metadata):
+    """Add documents.created_at and content_hash, and index the table"""
+    documents = metadata.tables['documents']
+    if _add_column(conn, documents, 'created_at'):
+        # Rows from before the column existed sort first, in path order
+        conn.execute(update(documents)
+                     .where(documents.c.created_at.is_(None))
+                     .values(created_at=datetime(1970, 1, 1,
+                                                 tzinfo=timezone.utc)))
+    _add_column(conn, documents, 'content_hash')
+    _create_indexes(conn, documents)
+
+
+def _jobs_v2(conn, metadata):
+    """Add jobs.owner and heartbeat_at"""
+    jobs = metadata.tables['jobs']
+    _add_column(conn, jobs, 'owner')
+    _add_column(conn, jobs, 'heartbeat_at')
+
+
+# (version, description, function(connection, metadata)), in order. Each
+# function must also work on a database create_all() just built.
+MIGRATIONS = [
+    (1, "documents: created_at, content_hash and indexes", _documents_v1),
+    (2, "jobs: owner and heartbeat_at", _jobs_v2),
+]
+
+
+def migrate(engine, metadata):
+    """
+    Apply every migration the database has not seen yet, each in its own
+    transaction.
+
+    Returns:
+        List of the versions applied
+    """
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    newly_applied = []
+    for version, description, function in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            function(conn, metadata)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description,
+                applied_at=datetime.now(timezone.utc)))
+        newly_applied.append(version)
+    return newly_applied
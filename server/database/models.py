@@ -1,27 +1,95 @@
-from sqlalchemy import create_engine, Column, String
+import os
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, Column, String, Text, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from database.migrations import migrate
 
-# Define the database connection
-DATABASE_URL = "postgresql://postgres:postgres@db:5432/mydatabase"
+# Define the database connection (override with e.g. sqlite:///local.db)
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL", "postgresql://postgres:postgres@db:5432/mydatabase")
+
+
+# Connection pool per process: DB_POOL_SIZE kept-open connections plus up
+# to DB_MAX_OVERFLOW more under load, waiting at most DB_POOL_TIMEOUT
+# seconds for one. Connections are recycled after DB_POOL_RECYCLE seconds
+# and checked before use, so server-side idle timeouts do not surface as
+# request errors. SQLite keeps SQLAlchemy's own pooling.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+
+def engine_options(url):
+    if url.startswith("sqlite"):
+        return {}
+    return dict(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=True)
 
 
 # Create SQLAlchemy engine and session factory
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# One session per thread (i.e. per request); the app removes it when the
+# request ends
+db_session = scoped_session(SessionLocal)
 Base = declarative_base()
 
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
 class Document(Base):
     __tablename__ = 'documents'
 
     path = Column(String,  primary_key=True)
     hash = Column(String, nullable=True)
     email = Column(String, nullable=False)
+    # SHA-256 of the stored PDF (see src.content_store)
+    content_hash = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False,
+                        default=utcnow)
+
+    __table_args__ = (
+        # /documents pages through (created_at, path), with or without an
+        # email filter
+        Index('ix_documents_email_created_at', 'email', 'created_at', 'path'),
+        Index('ix_documents_created_at', 'created_at', 'path'),
+        Index('ix_documents_hash', 'hash'),
+        Index('ix_documents_content_hash', 'content_hash'),
+    )
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, index=True)
+    # JSON encoded job input, per-file progress and result
+    params = Column(Text, nullable=True)
+    progress = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    # File produced by the job (e.g. the ZIP of redacted PDFs)
+    result_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    # "host:pid" of the process running the job, refreshed in heartbeat_at
+    # while it runs; recover() re-queues running jobs whose heartbeat stopped
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow,
+                        onupdate=utcnow)
 
 
 def create_tables():
+    # New databases get the full schema; existing ones are brought up to
+    # date by the migrations
     Base.metadata.create_all(bind=engine)
+    migrate(engine, Base.metadata)
 
 
 create_tables()
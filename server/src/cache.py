@@ -0,0 +1,230 @@
+# cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def digest(*parts):
+    """SHA-256 hex digest over a sequence of bytes/str parts"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        hasher.update(part)
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed key/value store on disk with size-bounded LRU
+    eviction and an optional time-to-live.
+
+    Every entry is one file under directory/<key[:2]>/<key>. A file's mtime
+    is its write time (used for the TTL) and reads bump its atime, so
+    eviction removes the least recently used entries first. Writes go
+    through a temp file and os.replace, so several processes can share the
+    same directory.
+    """
+
+    VERSION_FILE = ".version"
+
+    def __init__(self, directory, max_bytes, enabled=True, ttl=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yield (path, size, atime, mtime) for every entry in the cache"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp") or name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_atime, stat.st_mtime
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(entry[1] for entry in self._entries())
+        return self._size
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self._expired(stat.st_mtime):
+                self.delete(key)
+                with self._lock:
+                    self.expirations += 1
+                    self.misses += 1
+                return None
+
+            with open(path, 'rb') as f:
+                value = f.read()
+            # Bump the access time only; mtime stays the write time
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store bytes under key, evicting old entries if over max_bytes"""
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self.writes += 1
+            self._size = self._current_size() + len(value)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_json(self, key):
+        value = self.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def set_json(self, key, value):
+        self.set(key, json.dumps(value).encode('utf-8'))
+
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+        return True
+
+    def _expired(self, mtime):
+        return self.ttl is not None and time.time() - mtime > self.ttl
+
+    def ensure_version(self, version):
+        """
+        Drop every entry if the cache was filled under a different version
+        string, e.g. after a model or prompt change.
+
+        Returns:
+            True if the cache was cleared.
+        """
+        if not self.enabled:
+            return False
+
+        version_path = os.path.join(self.directory, self.VERSION_FILE)
+        try:
+            with open(version_path, 'r', encoding='utf-8') as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+
+        if current == version:
+            return False
+
+        if current is not None:
+            logger.info(f"Invalidating cache {self.directory}: version changed")
+        self.clear()
+        with open(version_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+        return current is not None
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        for path, *_ in list(self._entries()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._size = 0
+
+    def _evict(self):
+        """
+        Drop expired entries, then least recently used entries until the
+        cache is under 90% of max_bytes
+        """
+        # Rescan so entries written by other processes are accounted for
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        target = int(self.max_bytes * 0.9)
+
+        for path, entry_size, _, mtime in entries:
+            if size <= target and not self._expired(mtime):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            self.evictions += 1
+
+        self._size = size
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size_bytes": self._size if self._size is not None else 0,
+                "max_bytes": self.max_bytes,
+            }
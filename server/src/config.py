@@ -1,3 +1,4 @@
+import os
 
 SYSTEM_PROMPT = """
 Generate a structured JSON representation of any medical report provided by the user.
@@ -7,4 +8,127 @@ Keep the entire paragraphs intact as values under their respective keys — do n
 Ensure the generated JSON includes all the relevant information provided in the report.
 Retain only relevant medical data in a minified format. Make sure to remove the keys that are considered PHI or PII.
 Do not skip data. Return the output as a single string with JSON quotes.
-"""
\ No newline at end of file
+"""
+
+# Load the Presidio analyzer when the server starts and run one warm-up
+# analysis so the first /redact request does not pay for model loading.
+ANALYZER_PRELOAD = os.environ.get("ANALYZER_PRELOAD", "1") == "1"
+ANALYZER_WARMUP = os.environ.get("ANALYZER_WARMUP", "1") == "1"
+
+# Texts longer than ANALYZER_CHUNK_CHARS are analyzed in page/paragraph
+# aligned chunks overlapping by ANALYZER_CHUNK_OVERLAP characters (0
+# disables chunking). ANALYZER_WORKERS > 1 analyzes chunks in that many
+# worker processes.
+ANALYZER_CHUNK_CHARS = int(os.environ.get("ANALYZER_CHUNK_CHARS", "20000"))
+ANALYZER_CHUNK_OVERLAP = int(os.environ.get("ANALYZER_CHUNK_OVERLAP", "300"))
+ANALYZER_WORKERS = int(os.environ.get("ANALYZER_WORKERS", "1"))
+
+# Multi-file redaction handles the first file alone, then extracts up to
+# REDACTION_BATCH_DOCS files at a time and runs their texts through spaCy
+# together, ANALYZER_BATCH_SIZE texts per batch on ANALYZER_BATCH_PROCESSES
+# processes.
+REDACTION_BATCH_DOCS = int(os.environ.get("REDACTION_BATCH_DOCS", "8"))
+ANALYZER_BATCH_SIZE = int(os.environ.get("ANALYZER_BATCH_SIZE", "8"))
+ANALYZER_BATCH_PROCESSES = int(os.environ.get("ANALYZER_BATCH_PROCESSES", "1"))
+
+# How detected PII becomes redactions: "spans" redacts exactly the words
+# the analyzer flagged, using their offsets in the extracted text; "terms"
+# searches each document for the detected strings and redacts every
+# occurrence.
+REDACTION_MATCH = os.environ.get("REDACTION_MATCH", "spans")
+
+# How redacted PDFs are written: "secure" fully rewrites, sanitizes and
+# recompresses the file; "fast" only drops unreferenced objects; "stream"
+# is fast and keeps /redact results in memory instead of writing them to
+# disk (jobs always write files).
+REDACTION_SAVE_PROFILE = os.environ.get("REDACTION_SAVE_PROFILE", "secure")
+
+# Cache of redacted PDFs keyed by (input content hash, method,
+# replace_text, analyzer version and redaction settings), so resubmitting
+# identical bytes skips extraction, OCR and analysis
+REDACTION_CACHE_ENABLED = os.environ.get("REDACTION_CACHE_ENABLED", "1") == "1"
+REDACTION_CACHE_DIR = os.environ.get(
+    "REDACTION_CACHE_DIR", os.path.join("cache", "redaction"))
+REDACTION_CACHE_MAX_BYTES = int(os.environ.get(
+    "REDACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+REDACTION_CACHE_TTL = int(os.environ.get(
+    "REDACTION_CACHE_TTL", str(7 * 24 * 3600)))
+
+# How PII is detected:
+#   full   - every Presidio recognizer, with spaCy NER (default)
+#   tiered - precompiled regex/checksum stage for structured identifiers,
+#            then Presidio only for the DETECTION_NER_ENTITIES types
+#   regex  - regex/checksum stage only; spaCy is never loaded
+DETECTION_MODES = ("full", "tiered", "regex")
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "full")
+DETECTION_NER_ENTITIES = os.environ.get(
+    "DETECTION_NER_ENTITIES", "PERSON,LOCATION,NRP,DATE_TIME").split(",")
+
+# Worker processes used to extract and redact page ranges of a PDF in
+# parallel. 1 keeps the serial path; small documents are always serial.
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "1"))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "8"))
+
+# On-disk cache of Tesseract results keyed by image content and config
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join("cache", "ocr"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get(
+    "OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# OCR backend: "tesserocr" keeps a pool of at most JOB_WORKERS + PDF_WORKERS
+# initialised Tesseract instances per config and passes images in memory,
+# "pytesseract" runs the tesseract binary per image, "auto" uses tesserocr
+# when it is installed (it is optional: requirements-tesserocr.txt).
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+# Only OCR the regions of embedded images that an edge/connected-component
+# pre-filter flags as text; images with no text-like regions are skipped.
+OCR_PREFILTER = os.environ.get("OCR_PREFILTER", "1") == "1"
+
+# Page rasterization for ocr_from_pdf. Each page is rendered at the
+# resolution of its scanned images (OCR_FROM_PDF_DPI for pages without
+# images), clamped to [OCR_MIN_DPI, OCR_MAX_DPI] and to OCR_MAX_PAGE_PIXELS.
+# Pages whose text layer has at least OCR_TEXT_LAYER_MIN_CHARS readable
+# characters and no large images are not OCR'd at all.
+OCR_MIN_DPI = int(os.environ.get("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.environ.get("OCR_MAX_DPI", "300"))
+OCR_MAX_PAGE_PIXELS = int(os.environ.get("OCR_MAX_PAGE_PIXELS", str(40_000_000)))
+OCR_TEXT_LAYER_MIN_CHARS = int(os.environ.get("OCR_TEXT_LAYER_MIN_CHARS", "100"))
+
+# /documents page size for ?cursor= without ?limit=, and the upper bound of
+# ?limit= (requests with neither get every document)
+DOCUMENTS_PAGE_SIZE = int(os.environ.get("DOCUMENTS_PAGE_SIZE", "100"))
+DOCUMENTS_MAX_PAGE_SIZE = int(os.environ.get("DOCUMENTS_MAX_PAGE_SIZE", "1000"))
+
+# Background job queue for /jobs/redact and /jobs/structured
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "32"))
+JOB_STORAGE_FOLDER = os.environ.get("JOB_STORAGE_FOLDER", "job_storage")
+# Running jobs refresh their heartbeat every JOB_HEARTBEAT_INTERVAL seconds;
+# recover() re-queues running jobs whose heartbeat is older than
+# JOB_HEARTBEAT_TIMEOUT, i.e. whose process is gone
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_HEARTBEAT_TIMEOUT = float(os.environ.get("JOB_HEARTBEAT_TIMEOUT", "120"))
+
+# Ollama structured extraction. OLLAMA_CONCURRENCY should match the model
+# server's parallelism (OLLAMA_NUM_PARALLEL); OLLAMA_TIMEOUT is per request.
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:latest")
+OLLAMA_CONCURRENCY = int(os.environ.get("OLLAMA_CONCURRENCY", "4"))
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "300"))
+
+# Cache of /structured results: PDF digest -> OCR text and
+# (OCR text digest, model, prompt digest) -> structured JSON
+STRUCTURED_CACHE_ENABLED = os.environ.get("STRUCTURED_CACHE_ENABLED", "1") == "1"
+STRUCTURED_CACHE_DIR = os.environ.get(
+    "STRUCTURED_CACHE_DIR", os.path.join("cache", "structured"))
+STRUCTURED_CACHE_MAX_BYTES = int(os.environ.get(
+    "STRUCTURED_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+STRUCTURED_CACHE_TTL = int(os.environ.get(
+    "STRUCTURED_CACHE_TTL", str(7 * 24 * 3600)))
+# "json" asks Ollama for grammar-constrained JSON output ("" disables it);
+# only constrained output is cut off once its JSON value is complete.
+# Unrepairable output is regenerated up to OLLAMA_MAX_RETRIES times with
+# exponential backoff starting at OLLAMA_RETRY_BACKOFF seconds.
+OLLAMA_FORMAT = os.environ.get("OLLAMA_FORMAT", "json")
+OLLAMA_MAX_RETRIES = int(os.environ.get("OLLAMA_MAX_RETRIES", "3"))
+OLLAMA_RETRY_BACKOFF = float(os.environ.get("OLLAMA_RETRY_BACKOFF", "0.5"))
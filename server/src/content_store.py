@@ -0,0 +1,160 @@
+# content_store.py
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def save_stream(stream, path, chunk_size=_CHUNK_SIZE):
+    """
+    Copy a readable binary stream to path, hashing it on the way.
+
+    Returns:
+        (SHA-256 hex digest, number of bytes written)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def file_digest(path, chunk_size=_CHUNK_SIZE):
+    """SHA-256 of a file's contents, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _link(source, path):
+    """
+    Hard link source to path, copying it where hard links are not
+    supported.
+
+    Returns:
+        False if path already exists
+    """
+    try:
+        os.link(source, path)
+    except FileExistsError:
+        return False
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, path)
+    return True
+
+
+class ContentStore:
+    """
+    Content-addressed file storage with reference-counted paths.
+
+    The bytes of each distinct upload are kept once, as
+    root/objects/<digest[:2]>/<digest>. Every stored upload gets its own
+    path under root that is a hard link to that object, so callers can key
+    records by path as before, and the object's link count is its reference
+    count: an object with a single link is no longer referenced by any
+    path. On filesystems without hard links, paths fall back to copies.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.tmp = os.path.join(root, "tmp")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.tmp, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def object_path(self, content_hash):
+        return os.path.join(self.objects, content_hash[:2], content_hash)
+
+    def add(self, stream, filename):
+        """
+        Store an upload and give it a new path.
+
+        Parameters:
+            stream: Readable binary stream with the upload's bytes
+            filename: Safe file name used for the new path
+
+        Returns:
+            (path, SHA-256 hex digest of the contents, True if identical
+            bytes were already stored)
+        """
+        tmp_path = os.path.join(self.tmp, uuid.uuid4().hex)
+        path = os.path.join(self.root, f"{uuid.uuid4()}_{filename}")
+        try:
+            content_hash, _ = save_stream(stream, tmp_path)
+            object_path = self.object_path(content_hash)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+            # The temp file stays linked until the new path is, so the
+            # object is never unreferenced in between
+            with self._lock:
+                duplicate = os.path.exists(object_path)
+                if not duplicate:
+                    duplicate = not _link(tmp_path, object_path)
+                try:
+                    _link(object_path, path)
+                except FileNotFoundError:
+                    # Released by another process since the check; store
+                    # the object again from this upload
+                    duplicate = False
+                    _link(tmp_path, object_path)
+                    _link(object_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return path, content_hash, duplicate
+
+    def references(self, content_hash):
+        """Number of paths linked to the stored object (0 if not stored)"""
+        try:
+            return os.stat(self.object_path(content_hash)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def release(self, path, content_hash):
+        """Remove a path, and its object once no other path refers to it"""
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(path)
+            if self.references(content_hash) == 0:
+                try:
+                    os.remove(self.object_path(content_hash))
+                except FileNotFoundError:
+                    pass
+
+    def collect_garbage(self):
+        """
+        Remove every object no path refers to any more.
+
+        Returns:
+            Number of objects removed
+        """
+        removed = 0
+        with self._lock:
+            for root, _, files in os.walk(self.objects):
+                for name in files:
+                    object_path = os.path.join(root, name)
+                    try:
+                        if os.stat(object_path).st_nlink == 1:
+                            os.remove(object_path)
+                            removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
@@ -0,0 +1,172 @@
+# document_model.py
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+
+def _join_lines(words):
+    """
+    Join (line key, word, ref) triples into text, one line per line key.
+
+    Returns:
+        (text, spans) where spans holds (start, end, ref) of every word
+        in text
+    """
+    parts = []
+    spans = []
+    length = 0
+    current_key = None
+
+    for key, word, ref in words:
+        if parts:
+            separator = " " if key == current_key else "\n"
+            parts.append(separator)
+            length += 1
+        current_key = key
+        parts.append(word)
+        spans.append((length, length + len(word), ref))
+        length += len(word)
+
+    return "".join(parts), spans
+
+
+def _ocr_words(ocr_result):
+    for i, word in enumerate(ocr_result.get('text', [])):
+        if not word or not word.strip():
+            continue
+        key = (ocr_result['block_num'][i], ocr_result['par_num'][i],
+               ocr_result['line_num'][i])
+        yield key, word, i
+
+
+def _page_words(words):
+    for i, word in enumerate(words):
+        yield (word[5], word[6]), word[4], i
+
+
+def ocr_data_to_text(ocr_result):
+    """
+    Rebuild plain text from pytesseract image_to_data output, one line of
+    text per OCR line.
+    """
+    return _join_lines(_ocr_words(ocr_result))[0]
+
+
+def words_to_text(words):
+    """
+    Rebuild page text from fitz "words" tuples
+    (x0, y0, x1, y1, word, block_no, line_no, word_no).
+    """
+    return _join_lines(_page_words(words))[0]
+
+
+@dataclass(frozen=True)
+class WordLocation:
+    """
+    Where a word of ExtractedDocument.text came from: index into the
+    page's fitz words (xref is None), or into the OCR result of image xref
+    """
+    page: int
+    xref: int
+    index: int
+
+
+@dataclass
+class ImageContent:
+    """An embedded image and the OCR word boxes found in it"""
+    xref: int
+    width: int
+    height: int
+    ocr: dict
+
+    @property
+    def text(self):
+        return ocr_data_to_text(self.ocr)
+
+
+@dataclass
+class PageContent:
+    """Text-layer words and image OCR results for a single page"""
+    number: int
+    words: list = field(default_factory=list)
+    images: list = field(default_factory=list)
+
+    @property
+    def text(self):
+        return words_to_text(self.words)
+
+
+@dataclass
+class ExtractedDocument:
+    """
+    Everything extracted from a PDF in one pass. The same object feeds PII
+    analysis (through text) and redaction (through the OCR word boxes), so
+    no page is opened or OCR'd twice.
+    """
+    path: str
+    pages: list = field(default_factory=list)
+
+    # (text, word starts, word ends, WordLocation per word), built once
+    _index: tuple = field(default=None, init=False, repr=False,
+                          compare=False)
+
+    def _build_index(self):
+        parts = []
+        starts = []
+        ends = []
+        locations = []
+        length = 0
+
+        def add(header, text, spans, location):
+            nonlocal length
+            if not text.strip():
+                return
+            parts.append(header)
+            length += len(header)
+            for start, end, index in spans:
+                starts.append(length + start)
+                ends.append(length + end)
+                locations.append(location(index))
+            parts.append(text + "\n")
+            length += len(text) + 1
+
+        for page in self.pages:
+            number = page.number
+            text, spans = _join_lines(_page_words(page.words))
+            add(f"--- Page {number + 1} ---\n", text, spans,
+                lambda index: WordLocation(number, None, index))
+
+            for image in page.images:
+                text, spans = _join_lines(_ocr_words(image.ocr))
+                add(f"--- Image OCR on Page {number + 1} ---\n", text, spans,
+                    lambda index: WordLocation(number, image.xref, index))
+
+        self._index = ("".join(parts), starts, ends, locations)
+
+    @property
+    def text(self):
+        """Document text in the layout written by print_contents"""
+        if self._index is None:
+            self._build_index()
+        return self._index[0]
+
+    def locate(self, start, end):
+        """
+        WordLocation of every word overlapping text[start:end], so an
+        analyzer span maps straight back to word boxes without searching
+        the document for its text.
+        """
+        if self._index is None:
+            self._build_index()
+        _, starts, ends, locations = self._index
+
+        located = []
+        i = bisect_right(ends, start)
+        while i < len(starts) and starts[i] < end:
+            located.append(locations[i])
+            i += 1
+        return located
+
+    def ocr_by_xref(self):
+        """Map image xref to its OCR result"""
+        return {image.xref: image for page in self.pages
+                for image in page.images}
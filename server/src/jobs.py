@@ -0,0 +1,370 @@
+# jobs.py
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, update
+from database.models import SessionLocal, Job
+from src.config import JOB_HEARTBEAT_INTERVAL, JOB_HEARTBEAT_TIMEOUT
+from src.redaction_service import process_pdf_redaction
+from src.structured_service import process_structured_documents
+from src.metrics import JOBS_IN_FLIGHT, JOBS_FINISHED
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobManager:
+    """
+    Runs long redaction/extraction batches on a bounded local thread pool.
+
+    Job state lives in the jobs table, so status and results survive a
+    server restart; recover() re-queues jobs that were still pending when
+    the process that ran them stopped. Several server processes can share
+    the table: a job runs in whichever process claims it first, and
+    running jobs are owned by the process whose heartbeat keeps them
+    alive. No external broker is needed.
+    """
+
+    def __init__(self, storage_folder, max_workers=2, max_pending=32,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT):
+        self.storage_folder = storage_folder
+        self.max_pending = max_pending
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="job")
+        self._handlers = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        os.makedirs(self.storage_folder, exist_ok=True)
+
+    @property
+    def owner(self):
+        """Owner id of this process's running jobs"""
+        # A property, so forked workers do not share their parent's id
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, kind, handler):
+        """
+        Register a handler for a job kind.
+
+        The handler is called as handler(job_id, params, report) and returns
+        (result, result_path). report(index, **fields) updates the progress
+        entry of one file.
+        """
+        self._handlers[kind] = handler
+
+    def job_folder(self, job_id):
+        """Folder holding a job's inputs and outputs"""
+        return os.path.join(self.storage_folder, job_id)
+
+    def new_job_id(self):
+        return str(uuid.uuid4())
+
+    def submit(self, kind, params, files, job_id=None):
+        """
+        Persist a new job and queue it.
+
+        Parameters:
+            kind: Registered job kind
+            params: JSON serialisable job input
+            files: Names of the files processed, used for per-file progress
+            job_id: Id to use, e.g. when inputs were already saved to
+                    job_folder(job_id)
+
+        Returns:
+            The job id
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(
+                    f"Job queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+
+        job_id = job_id or self.new_job_id()
+        progress = {
+            'total': len(files),
+            'completed': 0,
+            'files': [{'name': name, 'status': QUEUED} for name in files]
+        }
+
+        db = SessionLocal()
+        try:
+            db.add(Job(
+                id=job_id,
+                kind=kind,
+                status=QUEUED,
+                params=json.dumps(params),
+                progress=json.dumps(progress)
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._pending -= 1
+            raise
+        finally:
+            db.close()
+
+        JOBS_IN_FLIGHT.inc(kind=kind)
+        self._executor.submit(self._run, job_id, kind)
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            if job is None:
+                return None
+            return {
+                'id': job.id,
+                'kind': job.kind,
+                'status': job.status,
+                'progress': json.loads(job.progress) if job.progress else None,
+                'result': json.loads(job.result) if job.result else None,
+                'result_path': job.result_path,
+                'error': job.error,
+                'created_at': job.created_at.isoformat() if job.created_at else None,
+                'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+            }
+        finally:
+            db.close()
+
+    def recover(self):
+        """
+        Re-queue jobs left queued by any process, and jobs left running by
+        a process whose heartbeat stopped more than heartbeat_timeout
+        seconds ago.
+
+        Safe to call from every server process: a queued job runs only in
+        the process that claims it, and live processes keep their running
+        jobs.
+        """
+        stale = datetime.now(timezone.utc) - timedelta(
+            seconds=self.heartbeat_timeout)
+        db = SessionLocal()
+        try:
+            jobs = db.query(Job).filter(or_(
+                Job.status == QUEUED,
+                (Job.status == RUNNING)
+                & (or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < stale))
+            )).all()
+            recovered = []
+            for job in jobs:
+                if job.status == RUNNING:
+                    # Jobs restart from the first file
+                    progress = job.progress
+                    if progress:
+                        progress = json.loads(progress)
+                        progress['completed'] = 0
+                        progress['files'] = [
+                            {'name': f['name'], 'status': QUEUED}
+                            for f in progress['files']]
+                        progress = json.dumps(progress)
+                    # Only if the owner did not refresh it in the meantime
+                    requeued = db.execute(
+                        update(Job)
+                        .where(Job.id == job.id, Job.status == RUNNING,
+                               Job.heartbeat_at == job.heartbeat_at)
+                        .values(status=QUEUED, owner=None, progress=progress)
+                    ).rowcount
+                    if not requeued:
+                        continue
+                recovered.append((job.id, job.kind))
+            db.commit()
+        finally:
+            db.close()
+
+        for job_id, kind in recovered:
+            logger.info(f"Recovering job {job_id}")
+            with self._lock:
+                self._pending += 1
+            JOBS_IN_FLIGHT.inc(kind=kind)
+            self._executor.submit(self._run, job_id, kind)
+
+        return [job_id for job_id, _ in recovered]
+
+    def _claim(self, job_id):
+        """
+        Mark a queued job as running in this process. Returns False if it
+        is gone or another process claimed it first.
+        """
+        db = SessionLocal()
+        try:
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, owner=self.owner,
+                        heartbeat_at=datetime.now(timezone.utc))
+            ).rowcount
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None and self._heartbeat.is_alive():
+                return
+            self._heartbeat = threading.Thread(
+                target=self._beat, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        """Refresh the heartbeat of this process's running jobs"""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            db = SessionLocal()
+            try:
+                db.execute(update(Job)
+                           .where(Job.owner == self.owner,
+                                  Job.status == RUNNING)
+                           .values(heartbeat_at=datetime.now(timezone.utc)))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Job heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def _update(self, job_id, **fields):
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            for name, value in fields.items():
+                setattr(job, name, value)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, job_id, kind):
+        try:
+            if not self._claim(job_id):
+                return
+            self._start_heartbeat()
+
+            db = SessionLocal()
+            try:
+                job = db.get(Job, job_id)
+                params = json.loads(job.params) if job.params else {}
+                progress = json.loads(job.progress)
+            finally:
+                db.close()
+
+            progress_lock = threading.Lock()
+
+            def report(index, **fields):
+                with progress_lock:
+                    progress['files'][index].update(fields)
+                    progress['completed'] = sum(
+                        1 for f in progress['files']
+                        if f['status'] in (COMPLETED, FAILED))
+                    self._update(job_id, progress=json.dumps(progress))
+
+            try:
+                result, result_path = self._handlers[kind](
+                    job_id, params, report)
+                self._update(job_id,
+                             status=COMPLETED,
+                             result=json.dumps(result),
+                             result_path=result_path)
+                JOBS_FINISHED.inc(kind=kind, status=COMPLETED)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                logger.debug(traceback.format_exc())
+                self._update(job_id, status=FAILED, error=str(e))
+                JOBS_FINISHED.inc(kind=kind, status=FAILED)
+        finally:
+            JOBS_IN_FLIGHT.dec(kind=kind)
+            with self._lock:
+                self._pending -= 1
+
+
+def redact_job(manager):
+    """Build the handler that redacts the PDFs saved for a job"""
+
+    def handler(job_id, params, report):
+        job_folder = manager.job_folder(job_id)
+        input_folder = os.path.join(job_folder, 'input')
+        output_folder = os.path.join(job_folder, 'output')
+        os.makedirs(output_folder, exist_ok=True)
+
+        input_paths = [os.path.join(input_folder, name)
+                       for name in params['files']]
+
+        def progress(index, output_path):
+            report(index, status=COMPLETED,
+                   output=os.path.basename(output_path))
+            if index + 1 < len(input_paths):
+                report(index + 1, status=RUNNING)
+
+        try:
+            if input_paths:
+                report(0, status=RUNNING)
+            output_paths = process_pdf_redaction(
+                input_paths,
+                output_folder,
+                params.get('method', 'full_redact'),
+                params.get('replace_text', '[REDACTED]'),
+                progress=progress
+            )
+
+            zip_path = os.path.join(job_folder, f'redacted_pdfs_{job_id}.zip')
+            with zipfile.ZipFile(zip_path, 'w') as zf:
+                for output_path in output_paths:
+                    zf.write(output_path, os.path.basename(output_path))
+        finally:
+            # Only the archive is kept, and the unredacted inputs are
+            # deleted whether or not the job succeeded
+            shutil.rmtree(input_folder, ignore_errors=True)
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+        return {'files': [os.path.basename(p) for p in output_paths]}, zip_path
+
+    return handler
+
+
+def structured_job(job_id, params, report):
+    """Extract structured data for stored documents and update their hashes"""
+    document_paths = params['document_paths']
+
+    # Documents finish out of order, so only completion is reported
+    def progress(index, result):
+        status = FAILED if 'error' in result else COMPLETED
+        report(index, status=status, error=result.get('error'))
+
+    db = SessionLocal()
+    try:
+        results = process_structured_documents(
+            document_paths, db, progress=progress)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return results, None
@@ -0,0 +1,326 @@
+# metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds (seconds) shared by every stage histogram; stages range from
+# sub-millisecond cache lookups to minute-long LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"'
+                          for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a running total kept elsewhere (used by collectors)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} "
+                         f"{_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label set"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.set_total(value, **labels)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations per label set"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> [per-bucket counts, sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def total(self, **labels):
+        """Sum of the observations"""
+        entry = self._values.get(self._key(labels))
+        return entry[1] if entry else 0.0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, (list(counts), total, count))
+                           for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key,
+                                        [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Process-local set of metrics.
+
+    Recording only touches in-memory counters. Collectors (callables that
+    refresh gauges from other components, e.g. cache statistics) run only
+    when the registry is rendered, so nothing is computed unless /metrics is
+    scraped.
+
+    Work done in ProcessPoolExecutor workers (PDF_WORKERS > 1) is recorded
+    in those processes and is not visible here; the enclosing stages in the
+    parent process still are.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames,
+                                        buckets))
+
+    def add_collector(self, collector):
+        """Register a callable run before every render"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for collector in collectors:
+            collector()
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "redaction_stage_seconds",
+    "Wall time spent in each pipeline stage",
+    ["stage"])
+STAGE_ERRORS = registry.counter(
+    "redaction_stage_errors_total",
+    "Pipeline stages that raised an exception",
+    ["stage"])
+OCR_CALLS = registry.counter(
+    "ocr_calls_total",
+    "Tesseract invocations (cache hits excluded)",
+    ["kind"])
+OCR_PREFILTER_RESULTS = registry.counter(
+    "ocr_prefilter_total",
+    "Images by text pre-filter decision (skipped, cropped, full)",
+    ["result"])
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total",
+    "Requests sent to the Ollama model",
+    ["model"])
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total",
+    "Tokens processed by the Ollama model",
+    ["model", "type"])
+LLM_OUTCOMES = registry.counter(
+    "llm_json_outcomes_total",
+    "Model responses by JSON outcome (parsed, repaired, invalid, failed)",
+    ["outcome"])
+BYTES_PROCESSED = registry.counter(
+    "bytes_processed_total",
+    "Document bytes read and written by the pipeline",
+    ["direction"])
+DOCUMENTS_PROCESSED = registry.counter(
+    "documents_processed_total",
+    "Documents processed, by operation",
+    ["operation"])
+PAGES_PROCESSED = registry.counter(
+    "pages_processed_total",
+    "PDF pages processed, by operation",
+    ["operation"])
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["endpoint"])
+HTTP_SECONDS = registry.histogram(
+    "http_request_seconds",
+    "Time to produce an HTTP response (streamed bodies excluded)",
+    ["endpoint", "method", "status"])
+CACHE_EVENTS = registry.counter(
+    "cache_events_total",
+    "Cache lookups and maintenance events since process start",
+    ["cache", "event"])
+CACHE_HIT_RATIO = registry.gauge(
+    "cache_hit_ratio",
+    "Cache hits divided by lookups since process start",
+    ["cache"])
+CACHE_SIZE_BYTES = registry.gauge(
+    "cache_size_bytes",
+    "Bytes currently stored in the cache",
+    ["cache"])
+
+JOBS_IN_FLIGHT = registry.gauge(
+    "jobs_in_flight",
+    "Background jobs queued or running",
+    ["kind"])
+JOBS_FINISHED = registry.counter(
+    "jobs_finished_total",
+    "Background jobs finished, by final status",
+    ["kind", "status"])
+ANALYZER_SECONDS = registry.gauge(
+    "analyzer_startup_seconds",
+    "Time spent loading and warming up the Presidio analyzer",
+    ["phase"])
+
+
+@contextmanager
+def stage(name):
+    """Time a block of work as the given pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_cache(name, cache):
+    """Export a DiskCache's stats() as gauges at scrape time"""
+    def collect():
+        stats = cache.stats()
+        for event in ("hits", "misses", "writes", "evictions", "expirations"):
+            CACHE_EVENTS.set_total(stats[event], cache=name, event=event)
+        CACHE_HIT_RATIO.set(stats["hit_rate"], cache=name)
+        CACHE_SIZE_BYTES.set(stats["size_bytes"], cache=name)
+    registry.add_collector(collect)
+
+
+def render():
+    return registry.render()
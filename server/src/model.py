@@ -1,53 +1,417 @@
 # model.py
-from presidio_analyzer import AnalyzerEngine, Pattern, PatternRecognizer
+import logging
+import threading
+from importlib import metadata
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from presidio_analyzer import (AnalyzerEngine, BatchAnalyzerEngine, Pattern,
+                               PatternRecognizer)
+from src.config import (ANALYZER_CHUNK_CHARS, ANALYZER_CHUNK_OVERLAP,
+                        ANALYZER_WORKERS, ANALYZER_BATCH_SIZE,
+                        ANALYZER_BATCH_PROCESSES, DETECTION_MODE,
+                        DETECTION_MODES, DETECTION_NER_ENTITIES)
+from src.metrics import stage, registry, ANALYZER_SECONDS
+from src.regex_detector import find_entities, RULES_SIGNATURE
+from src.text_chunks import split_text
 
-def analyze_text_from_string(text, file_name="Uploaded text"):
-    """Analyze text content for PII using Presidio"""
-    
+logger = logging.getLogger(__name__)
+
+# Process-wide analyzer shared by every request. Building an AnalyzerEngine
+# loads the spaCy pipeline and all predefined recognizers, so it is done once.
+_analyzer = None
+_analyzer_lock = threading.Lock()
+_custom_recognizers = {}
+_analyzer_metrics = {
+    "loaded": False,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "loaded_at": None,
+    "recognizer_count": 0,
+    "custom_recognizers": [],
+    "analyses": 0,
+}
+
+WARMUP_TEXT = "Patient John Smith, Aadhaar 1234 5678 9012, phone 9876543210."
+
+# Only entities scored above this are treated as PII
+SCORE_THRESHOLD = 0.7
+
+# spaCy pipeline AnalyzerEngine() loads by default
+SPACY_MODEL = "en_core_web_lg"
+
+# A detected entity in document coordinates
+Entity = namedtuple("Entity", ["entity_type", "start", "end", "score"])
+
+# Pool of analysis worker processes, created on first chunked analysis
+_chunk_pool = None
+_chunk_pool_lock = threading.Lock()
+
+
+def build_aadhaar_recognizer():
+    """Create the recognizer for Indian Aadhaar numbers"""
     # Aadhaar number pattern: 1234-5678-9012 or 123456789012
     aadhaar_pattern = Pattern(
-        name="aadhaar_pattern", 
-        regex=r"\b\d{4}[- ]?\d{4}[- ]?\d{4}\b", 
+        name="aadhaar_pattern",
+        regex=r"\b\d{4}[- ]?\d{4}[- ]?\d{4}\b",
         score=0.85
     )
-    
-    # Create a recognizer for Aadhaar
-    aadhaar_recognizer = PatternRecognizer(
-        supported_entity="AADHAAR_IN", 
-        patterns=[aadhaar_pattern]
+
+    return PatternRecognizer(
+        supported_entity="AADHAAR_IN",
+        patterns=[aadhaar_pattern],
+        name="aadhaar_recognizer"
     )
-    
-    # Initialize analyzer engine
-    analyzer = AnalyzerEngine()
-    analyzer.registry.add_recognizer(aadhaar_recognizer)
-    
-    # Analyze
-    results = analyzer.analyze(text=text, language='en')
-    
+
+
+def register_recognizer(recognizer):
+    """
+    Register a custom recognizer with the shared analyzer.
+
+    Recognizers are keyed by name, so registering the same one again is a
+    no-op. If the analyzer is already loaded the recognizer is added to it
+    immediately, otherwise it is picked up when the analyzer loads.
+
+    Returns:
+        True if the recognizer was newly registered, False otherwise.
+    """
+    with _analyzer_lock:
+        if recognizer.name in _custom_recognizers:
+            return False
+
+        _custom_recognizers[recognizer.name] = recognizer
+        if _analyzer is not None:
+            _analyzer.registry.add_recognizer(recognizer)
+            _analyzer_metrics["recognizer_count"] = len(
+                _analyzer.registry.recognizers)
+        _analyzer_metrics["custom_recognizers"] = list(_custom_recognizers)
+        return True
+
+
+def get_analyzer():
+    """Return the shared AnalyzerEngine, loading it on first use"""
+    global _analyzer
+
+    if _analyzer is not None:
+        return _analyzer
+
+    with _analyzer_lock:
+        if _analyzer is None:
+            start = time.perf_counter()
+            analyzer = AnalyzerEngine()
+            for recognizer in _custom_recognizers.values():
+                analyzer.registry.add_recognizer(recognizer)
+
+            _analyzer_metrics.update({
+                "loaded": True,
+                "load_seconds": time.perf_counter() - start,
+                "loaded_at": time.time(),
+                "recognizer_count": len(analyzer.registry.recognizers),
+                "custom_recognizers": list(_custom_recognizers),
+            })
+            logger.info("Presidio analyzer loaded in %.2fs",
+                        _analyzer_metrics["load_seconds"])
+            _analyzer = analyzer
+
+    return _analyzer
+
+
+def load_analyzer(warm_up=True, sample_text=WARMUP_TEXT):
+    """
+    Load the shared analyzer at startup.
+
+    Parameters:
+        warm_up: Run one analysis so lazily initialised spaCy components
+                 are ready before the first request arrives
+        sample_text: Text used for the warm-up analysis
+    """
+    analyzer = get_analyzer()
+
+    if warm_up and _analyzer_metrics["warmup_seconds"] is None:
+        start = time.perf_counter()
+        analyzer.analyze(text=sample_text, language='en')
+        _analyzer_metrics["warmup_seconds"] = time.perf_counter() - start
+        logger.info("Presidio analyzer warmed up in %.2fs",
+                    _analyzer_metrics["warmup_seconds"])
+
+    return analyzer
+
+
+def get_analyzer_metrics():
+    """Return a snapshot of the analyzer load-time metrics"""
+    with _analyzer_lock:
+        return dict(_analyzer_metrics)
+
+
+def _collect_analyzer_metrics():
+    metrics = get_analyzer_metrics()
+    for phase in ("load", "warmup"):
+        seconds = metrics[f"{phase}_seconds"]
+        if seconds is not None:
+            ANALYZER_SECONDS.set(seconds, phase=phase)
+
+
+registry.add_collector(_collect_analyzer_metrics)
+register_recognizer(build_aadhaar_recognizer())
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+def analyzer_version(mode=DETECTION_MODE):
+    """
+    Describe everything that decides which entities a mode detects:
+    Presidio and spaCy model versions, recognizers, entity types, score
+    threshold and regex rules. Cached analysis results are only valid for
+    the same version string.
+    """
+    with _analyzer_lock:
+        recognizers = [
+            (name, [(pattern.regex, pattern.score)
+                    for pattern in getattr(recognizer, "patterns", [])])
+            for name, recognizer in sorted(_custom_recognizers.items())]
+    parts = [f"mode={mode}", f"threshold={SCORE_THRESHOLD}",
+             f"regex={RULES_SIGNATURE}"]
+    if mode != "regex":
+        parts += [f"presidio={_package_version('presidio_analyzer')}",
+                  f"spacy={SPACY_MODEL}-{_package_version(SPACY_MODEL)}",
+                  f"recognizers={recognizers}",
+                  f"entities={_presidio_entities(mode)}"]
+    return ";".join(parts)
+
+
+def _check_mode(mode):
+    if mode not in DETECTION_MODES:
+        raise ValueError(f"Unknown detection mode: {mode}")
+
+
+def _presidio_entities(mode):
+    """Entity types Presidio looks for in a mode (None means all of them)"""
+    return DETECTION_NER_ENTITIES if mode == "tiered" else None
+
+
+def _regex_entities(text, offset=0):
+    return [Entity(entity_type, start + offset, end + offset, score)
+            for entity_type, start, end, score in find_entities(text)]
+
+
+def _analyze_chunk(chunk_text, offset, mode=DETECTION_MODE):
+    """Analyze one chunk and return its entities in document coordinates"""
+    entities = []
+    if mode != "full":
+        with stage("analyze_regex"):
+            entities.extend(_regex_entities(chunk_text, offset))
+    if mode != "regex":
+        results = get_analyzer().analyze(text=chunk_text, language='en',
+                                         entities=_presidio_entities(mode))
+        entities.extend(Entity(r.entity_type, r.start + offset,
+                               r.end + offset, r.score)
+                        for r in results)
+    return entities
+
+
+def _get_chunk_pool(workers):
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            # Forked workers inherit an already loaded analyzer; otherwise
+            # each loads its own on the first chunk
+            _chunk_pool = ProcessPoolExecutor(max_workers=workers)
+    return _chunk_pool
+
+
+def merge_entities(entities):
+    """
+    Deduplicate entities found by overlapping chunks: identical spans keep
+    the highest score, and a span inside another span of the same type is
+    dropped.
+    """
+    best = {}
+    for entity in entities:
+        key = (entity.entity_type, entity.start, entity.end)
+        if key not in best or entity.score > best[key].score:
+            best[key] = entity
+
+    merged = []
+    reach = {}
+    # Longest span first at each start, so contained spans come after it
+    for entity in sorted(best.values(), key=lambda e: (e.start, -e.end)):
+        if reach.get(entity.entity_type, -1) >= entity.end:
+            continue
+        reach[entity.entity_type] = max(reach.get(entity.entity_type, -1),
+                                        entity.end)
+        merged.append(entity)
+    return merged
+
+
+def iter_analyze_chunks(text, max_chars=ANALYZER_CHUNK_CHARS,
+                        overlap=ANALYZER_CHUNK_OVERLAP, workers=ANALYZER_WORKERS,
+                        mode=DETECTION_MODE):
+    """
+    Analyze a large text in page/paragraph aligned, overlapping chunks.
+
+    With workers > 1 the chunks are analyzed concurrently in worker
+    processes. Entities found in an overlap are reported by both chunks;
+    merge_entities removes the duplicates.
+
+    Yields:
+        (TextChunk, list of Entity) as each chunk completes; TextChunk.pages
+        lists the page numbers the chunk covers
+    """
+    chunks = split_text(text, max_chars, overlap)
+
+    if workers <= 1 or len(chunks) == 1:
+        for chunk in chunks:
+            yield chunk, _analyze_chunk(text[chunk.start:chunk.end],
+                                        chunk.start, mode)
+        return
+
+    pool = _get_chunk_pool(workers)
+    futures = {pool.submit(_analyze_chunk, text[chunk.start:chunk.end],
+                           chunk.start, mode): chunk
+               for chunk in chunks}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
+def _needs_chunking(text, mode):
+    # The regex stage is linear in the text and keeps no per-token state,
+    # so only passes that involve spaCy are chunked
+    return (mode != "regex" and ANALYZER_CHUNK_CHARS
+            and len(text) > ANALYZER_CHUNK_CHARS)
+
+
+def analyze_text_entities(text, mode=DETECTION_MODE):
+    """
+    Detect PII entities in text.
+
+    Texts longer than ANALYZER_CHUNK_CHARS are analyzed in chunks (see
+    iter_analyze_chunks) so spaCy never holds the whole document at once.
+
+    Parameters:
+        text: Text to analyze
+        mode: "full", "tiered" or "regex" (see DETECTION_MODE)
+
+    Returns:
+        List of Entity sorted by position, scored above SCORE_THRESHOLD
+    """
+    _check_mode(mode)
+    with stage("analyze_text"):
+        if _needs_chunking(text, mode):
+            entities = []
+            for _, chunk_entities in iter_analyze_chunks(text, mode=mode):
+                entities.extend(e for e in chunk_entities
+                                if e.score > SCORE_THRESHOLD)
+            entities = merge_entities(entities)
+        else:
+            entities = sorted((e for e in _analyze_chunk(text, 0, mode)
+                               if e.score > SCORE_THRESHOLD),
+                              key=lambda e: (e.start, -e.end))
+    _analyzer_metrics["analyses"] += 1
+
+    return entities
+
+
+def analyze_texts_entities(texts, batch_size=ANALYZER_BATCH_SIZE,
+                           n_process=ANALYZER_BATCH_PROCESSES,
+                           mode=DETECTION_MODE):
+    """
+    Detect PII entities in several texts at once.
+
+    Texts are run through the spaCy pipeline together (nlp.pipe), so the
+    model works on batches instead of one document at a time. Texts too
+    long for a single pass go through the chunked path instead.
+
+    Parameters:
+        texts: List of texts
+        batch_size: Texts per spaCy batch
+        n_process: spaCy worker processes
+        mode: "full", "tiered" or "regex" (see DETECTION_MODE)
+
+    Returns:
+        List of entity lists (as analyze_text_entities), in input order
+    """
+    _check_mode(mode)
+    results = [None] * len(texts)
+    batch = []
+    for index, text in enumerate(texts):
+        if mode == "regex" or _needs_chunking(text, mode):
+            results[index] = analyze_text_entities(text, mode)
+        else:
+            batch.append(index)
+
+    if batch:
+        engine = BatchAnalyzerEngine(analyzer_engine=get_analyzer())
+        with stage("analyze_batch"):
+            batch_results = engine.analyze_iterator(
+                [texts[index] for index in batch],
+                language='en',
+                batch_size=batch_size,
+                n_process=n_process,
+                entities=_presidio_entities(mode))
+        for index, recognizer_results in zip(batch, batch_results):
+            entities = [Entity(r.entity_type, r.start, r.end, r.score)
+                        for r in recognizer_results]
+            if mode == "tiered":
+                with stage("analyze_regex"):
+                    entities.extend(_regex_entities(texts[index]))
+            results[index] = sorted(
+                (e for e in entities if e.score > SCORE_THRESHOLD),
+                key=lambda e: (e.start, -e.end))
+        _analyzer_metrics["analyses"] += len(batch)
+
+    return results
+
+
+def entities_to_terms(text, entities):
+    """Distinct entity strings, grouped by entity type"""
     # Initialize grouped entity dictionary
     grouped_entities = {}
-    
+
     # Group the results
-    for r in results:
-        if r.score > 0.7:  # Include only entities with a score > 0.7
-            entity_type = r.entity_type
-            entity_text = text[r.start:r.end]
-            
-            if entity_type not in grouped_entities:
-                grouped_entities[entity_type] = []
-            
-            grouped_entities[entity_type].append(entity_text)
-    
+    for entity in entities:
+        entity_text = text[entity.start:entity.end]
+        grouped_entities.setdefault(entity.entity_type, []).append(entity_text)
+
     # Convert grouped entities to a clean list of text
     output_list = []
-    if grouped_entities:
-        for entities in grouped_entities.values():
-            output_list.extend(set(entities))  # Flatten and remove duplicates
-    
+    for values in grouped_entities.values():
+        output_list.extend(set(values))  # Flatten and remove duplicates
+    return output_list
+
+
+def analyze_text_from_string(text, file_name="Uploaded text"):
+    """Analyze text content for PII using Presidio"""
+    output_list = entities_to_terms(text, analyze_text_entities(text))
+
     print(f"Identified PII in {file_name}: {output_list}")
     return output_list
 
 
+def analyze_texts_from_strings(texts, file_names=None):
+    """
+    Analyze several texts for PII in one batch
+
+    Returns:
+        List of PII term lists in the format of analyze_text_from_string,
+        in input order
+    """
+    if file_names is None:
+        file_names = ["Uploaded text"] * len(texts)
+
+    output_lists = []
+    for text, entities, file_name in zip(
+            texts, analyze_texts_entities(texts), file_names):
+        output_list = entities_to_terms(text, entities)
+        print(f"Identified PII in {file_name}: {output_list}")
+        output_lists.append(output_list)
+    return output_lists
+
+
 # The following function is kept for compatibility with original code
 def analyze_single_file(file_path="extracted.txt"):
     """Handle file analysis for a single file on a local machine"""
@@ -58,4 +422,4 @@ def analyze_single_file(file_path="extracted.txt"):
         return output_list  # Return the list for further use
     except Exception as e:
         print(f"Error analyzing file: {e}")
-        return []
\ No newline at end of file
+        return []
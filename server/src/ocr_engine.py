@@ -0,0 +1,245 @@
+# ocr_engine.py
+import atexit
+import logging
+import os
+import queue
+import shlex
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pytesseract
+from PIL import Image
+from src.config import OCR_BACKEND, OCR_LANG, JOB_WORKERS, PDF_WORKERS
+
+try:
+    import tesserocr
+except ImportError:  # optional, needs libtesseract
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of Tesseract's TSV output, as returned by pytesseract
+TSV_COLUMNS = ["level", "page_num", "block_num", "par_num", "line_num",
+               "word_num", "left", "top", "width", "height", "conf", "text"]
+
+
+def parse_config(config):
+    """
+    Split a tesseract command line config such as
+    "--oem 3 --psm 6 -c preserve_interword_spaces=1" into
+    (oem, psm, variables).
+    """
+    oem = None
+    psm = None
+    variables = {}
+    args = shlex.split(config or "")
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--oem" and i + 1 < len(args):
+            oem = int(args[i + 1])
+            i += 1
+        elif arg == "--psm" and i + 1 < len(args):
+            psm = int(args[i + 1])
+            i += 1
+        elif arg == "-c" and i + 1 < len(args):
+            name, _, value = args[i + 1].partition("=")
+            variables[name] = value
+            i += 1
+        i += 1
+    return oem, psm, variables
+
+
+def tsv_to_dict(tsv):
+    """Parse headerless Tesseract TSV into pytesseract's Output.DICT format"""
+    result = {column: [] for column in TSV_COLUMNS}
+    text_index = len(TSV_COLUMNS) - 1
+
+    for line in tsv.splitlines():
+        if not line:
+            continue
+        cells = line.split("\t")
+        # Non-word rows may omit the empty text cell
+        cells += [""] * (len(TSV_COLUMNS) - len(cells))
+        for i, column in enumerate(TSV_COLUMNS):
+            value = cells[i]
+            if i != text_index:
+                try:
+                    value = int(float(value))
+                except ValueError:
+                    pass
+            result[column].append(value)
+
+    return result
+
+
+def to_pil(image):
+    """PIL view of an OpenCV/NumPy image (BGR or grayscale) or a PIL image"""
+    if isinstance(image, Image.Image):
+        return image
+    image = np.asarray(image)
+    if image.ndim == 3 and image.shape[2] == 3:
+        image = np.ascontiguousarray(image[:, :, ::-1])
+    elif image.ndim == 3 and image.shape[2] == 4:
+        image = np.ascontiguousarray(image[:, :, [2, 1, 0, 3]])
+    return Image.fromarray(image)
+
+
+class PytesseractEngine:
+    """
+    Runs the tesseract binary through pytesseract: one process per call,
+    with the image passed through a temp file.
+    """
+    name = "pytesseract"
+
+    def __init__(self, lang=OCR_LANG):
+        self.lang = lang
+
+    def image_to_string(self, image, config=""):
+        return pytesseract.image_to_string(image, lang=self.lang,
+                                           config=config)
+
+    def image_to_data(self, image, config=""):
+        return pytesseract.image_to_data(
+            image,
+            lang=self.lang,
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """
+    Keeps a bounded pool of initialised Tesseract APIs per config through
+    tesserocr. Each call checks an API out of the pool and returns it when
+    done, so the language model is loaded at most pool_size times per
+    config however many threads serve requests. Images are passed in
+    memory; tesserocr releases the GIL while recognising, so threads OCR in
+    parallel.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang=OCR_LANG, pool_size=JOB_WORKERS + PDF_WORKERS):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.lang = lang
+        self.pool_size = max(pool_size, 1)
+        # config -> queue of idle APIs, and how many were created per config
+        self._idle = {}
+        self._created = {}
+        self._lock = threading.Lock()
+
+    def _create(self, config):
+        oem, psm, variables = parse_config(config)
+        api = tesserocr.PyTessBaseAPI(
+            lang=self.lang,
+            psm=tesserocr.PSM.AUTO if psm is None else psm,
+            oem=tesserocr.OEM.DEFAULT if oem is None else oem)
+        for name, value in variables.items():
+            api.SetVariable(name, value)
+        return api
+
+    @contextmanager
+    def _api(self, config):
+        """Check an API instance for config out of the pool"""
+        # Engine mode is fixed at init and variables stick to an instance,
+        # so each distinct config gets its own pool
+        with self._lock:
+            idle = self._idle.setdefault(config, queue.Queue())
+            create = (idle.empty()
+                      and self._created.get(config, 0) < self.pool_size)
+            if create:
+                self._created[config] = self._created.get(config, 0) + 1
+
+        if create:
+            try:
+                api = self._create(config)
+            except Exception:
+                with self._lock:
+                    self._created[config] -= 1
+                raise
+        else:
+            # Wait for another thread to return one
+            api = idle.get()
+
+        try:
+            yield api
+        finally:
+            api.Clear()
+            idle.put(api)
+
+    def image_to_string(self, image, config=""):
+        with self._api(config) as api:
+            api.SetImage(to_pil(image))
+            return api.GetUTF8Text()
+
+    def image_to_data(self, image, config=""):
+        with self._api(config) as api:
+            api.SetImage(to_pil(image))
+            api.Recognize()
+            return tsv_to_dict(api.GetTSVText(0))
+
+    def close(self):
+        """End every idle API; the pool is empty afterwards"""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+            self._created = {}
+        for idle in pools.values():
+            while True:
+                try:
+                    idle.get_nowait().End()
+                except queue.Empty:
+                    break
+
+
+def create_engine(backend=OCR_BACKEND):
+    """
+    Build the OCR engine for a backend name: "tesserocr", "pytesseract",
+    or "auto" (tesserocr when it is installed and can load the language
+    data, pytesseract otherwise).
+    """
+    if backend == "pytesseract":
+        return PytesseractEngine()
+
+    if backend not in ("auto", "tesserocr"):
+        raise ValueError(f"Unknown OCR backend: {backend}")
+
+    try:
+        engine = TesserocrEngine()
+        # Fail here rather than on the first image if the language data
+        # cannot be loaded
+        with engine._api(""):
+            pass
+        return engine
+    except Exception as e:
+        if backend == "tesserocr":
+            raise
+        logger.info(f"tesserocr unavailable ({e}), using pytesseract")
+        return PytesseractEngine()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide OCR engine, created on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine()
+                atexit.register(_engine.close)
+    return _engine
+
+
+def _reset_after_fork():
+    # API instances belong to the parent; a forked worker builds its own
+    global _engine
+    _engine = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
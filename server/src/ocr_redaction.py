@@ -1,154 +1,686 @@
 # ocr_redaction.py
 import fitz
-import pytesseract
 import cv2
 import io
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
-
-
-def print_contents(input_path, output_txt_path):
+from src.config import PDF_WORKERS, PDF_PARALLEL_MIN_PAGES
+from src.config import REDACTION_SAVE_PROFILE
+from src.config import OCR_CACHE_ENABLED, OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES
+from src.config import (OCR_MIN_DPI, OCR_MAX_DPI, OCR_MAX_PAGE_PIXELS,
+                        OCR_TEXT_LAYER_MIN_CHARS, OCR_PREFILTER)
+from src.document_model import ExtractedDocument, PageContent, ImageContent
+from src.cache import DiskCache, digest
+from src.term_matcher import TermMatcher
+from src.ocr_engine import get_engine, TSV_COLUMNS
+from src.text_detector import find_text_regions
+from src.metrics import (stage, timed, register_cache, OCR_CALLS,
+                         OCR_PREFILTER_RESULTS, PAGES_PROCESSED,
+                         BYTES_PROCESSED)
+
+OCR_CONFIG = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
+# Render resolution used by ocr_from_pdf for pages without scanned images
+OCR_FROM_PDF_DPI = 300
+# Everything that changes ocr_from_pdf output, for cache keys
+OCR_FROM_PDF_SETTINGS = (f"dpi={OCR_FROM_PDF_DPI},{OCR_MIN_DPI}-{OCR_MAX_DPI};"
+                         f"pixels={OCR_MAX_PAGE_PIXELS};"
+                         f"text_layer={OCR_TEXT_LAYER_MIN_CHARS};gray")
+# Block numbers of the n-th OCR'd region start at n * this
+_REGION_BLOCK_STRIDE = 1000
+# Re-encoding quality for redacted JPEG images
+_JPEG_QUALITY = 92
+# Images covering less of the page than this do not drive the render DPI
+# and do not stop a good text layer from being used
+_SIGNIFICANT_IMAGE_AREA = 0.1
+
+# doc.save() options of each output profile. Redacted pages get new content
+# streams and the old ones are only unreferenced, so every profile needs at
+# least garbage=1 to drop them; an incremental save would keep the original
+# text in the file and is never used.
+SAVE_PROFILES = {
+    # Full rewrite: merge duplicate objects, sanitize content streams and
+    # compress every stream
+    "secure": dict(garbage=4, clean=True, deflate=True),
+    # Drop unreferenced objects and copy already compressed streams as they
+    # are; only streams written by the redaction (new page contents and
+    # replaced images) get compressed
+    "fast": dict(garbage=1, deflate=True),
+    # As fast; callers write the result to memory instead of a file
+    "stream": dict(garbage=1, deflate=True),
+}
+
+# Tesseract results keyed by image content, shared across documents
+ocr_cache = DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES,
+                      enabled=OCR_CACHE_ENABLED)
+register_cache("ocr", ocr_cache)
+
+
+def _resolve_workers(workers, page_count):
+    """Return the number of worker processes to use for a document"""
+    if workers is None:
+        workers = PDF_WORKERS
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        return 1
+    return min(workers, page_count)
+
+
+def _page_ranges(page_count, workers):
     """
-    Extract all text content from a PDF and write it to a text file.
+    Split a document into contiguous (start, end) page ranges.
 
-    Parameters:
-        input_path: Path to the input PDF file
-        output_txt_path: Path where the extracted text will be saved
+    Two ranges per worker keep the pool busy when some pages are much
+    heavier to OCR than others.
+    """
+    chunks = min(page_count, workers * 2)
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _run_page_ranges(func, input_path, page_count, workers, *args):
+    """
+    Run func(input_path, start, end, *args) for every page range in a
+    process pool and return the results in page order.
     """
+    ranges = _page_ranges(page_count, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, input_path, start, end, *args)
+                   for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def _page_count(input_path):
+    with fitz.open(input_path) as doc:
+        return doc.page_count
+
+
+def _extract_page_range(input_path, start, end):
+    """Extract text-layer words and image OCR boxes for pages [start, end)"""
     doc = fitz.open(input_path)
-    all_text = []
+    pages = []
+    images_by_xref = {}
 
-    # Extract text from document text layer
-    for page_num, page in enumerate(doc):
-        # Use "text" mode for better text extraction
-        text = page.get_text("text")
-        if text.strip():  # Only add non-empty text
-            all_text.append(f"--- Page {page_num + 1} ---\n{text}\n")
+    for page_num in range(start, end):
+        page = doc[page_num]
+        page_content = PageContent(number=page_num,
+                                   words=page.get_text("words"))
 
         # Also extract text from images using OCR
         for img in page.get_images(full=True):
             xref = img[0]
-            base_image = doc.extract_image(xref)
-            img_bytes = base_image["image"]
 
-            # Convert image bytes to format suitable for OCR
-            image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-            open_cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            # Images shared between pages are OCR'd once
+            if xref not in images_by_xref:
+                base_image = doc.extract_image(xref)
+                if not base_image:
+                    continue
+
+                images_by_xref[xref] = ImageContent(
+                    xref=xref,
+                    width=base_image["width"],
+                    height=base_image["height"],
+                    ocr=perform_ocr_data(img_bytes=base_image["image"])
+                )
+
+            page_content.images.append(images_by_xref[xref])
 
-            # Perform OCR on the image
-            ocr_text = perform_ocr(open_cv_image)
-            if ocr_text.strip():  # Only add non-empty OCR text
-                all_text.append(
-                    f"--- Image OCR on Page {page_num + 1} ---\n{ocr_text}\n")
+        pages.append(page_content)
+
+    doc.close()
+    return pages
+
+
+def extract_document(input_path, workers=None):
+    """
+    Extract the text layer and OCR every embedded image of a PDF once.
+
+    Parameters:
+        input_path: Path to the input PDF file
+        workers: Number of worker processes used to extract page ranges in
+                 parallel (defaults to PDF_WORKERS, 1 means serial)
+
+    Returns:
+        ExtractedDocument shared by PII analysis and legal_redact_pdf
+    """
+    page_count = _page_count(input_path)
+    workers = _resolve_workers(workers, page_count)
+
+    with stage("extract_document"):
+        if workers == 1:
+            pages = _extract_page_range(input_path, 0, page_count)
+        else:
+            pages = []
+            for chunk in _run_page_ranges(_extract_page_range, input_path,
+                                          page_count, workers):
+                pages.extend(chunk)
+    PAGES_PROCESSED.inc(page_count, operation="extract")
+
+    return ExtractedDocument(path=input_path, pages=pages)
+
+
+def print_contents(input_path, output_txt_path, workers=None):
+    """
+    Extract all text content from a PDF and write it to a text file.
+
+    Parameters:
+        input_path: Path to the input PDF file
+        output_txt_path: Path where the extracted text will be saved
+        workers: Number of worker processes used to extract page ranges in
+                 parallel (defaults to PDF_WORKERS, 1 means serial)
+    """
+    document = extract_document(input_path, workers=workers)
 
     # Write all extracted text to the output file
     with open(output_txt_path, 'w', encoding='utf-8') as f:
-        f.write("".join(all_text))
+        f.write(document.text)
 
     print(f"Extracted text saved to {output_txt_path}")
-    doc.close()
+    return document
+
+
+def _page_images(page):
+    """(coverage fraction, native DPI) of the significant images on a page"""
+    page_area = abs(page.rect) or 1
+    images = []
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        if bbox.is_empty:
+            continue
+        coverage = abs(bbox) / page_area
+        if coverage < _SIGNIFICANT_IMAGE_AREA:
+            continue
+        # Pixels per inch of the image as placed on the page
+        dpi = max(info["width"] * 72 / bbox.width,
+                  info["height"] * 72 / bbox.height)
+        images.append((coverage, dpi))
+    return images
+
+
+def _usable_text_layer(page, images):
+    """
+    Return the page's text layer if it can stand in for OCR: enough
+    readable characters and no large image that might hold more text.
+    """
+    if sum(coverage for coverage, _ in images) >= 0.5:
+        return None
 
+    text = page.get_text("text")
+    readable = sum(1 for char in text if char.isalnum())
+    # Broken font encodings come out as replacement characters
+    garbled = text.count("\ufffd")
+    if readable < OCR_TEXT_LAYER_MIN_CHARS or garbled > readable * 0.05:
+        return None
+    return text
 
-def ocr_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    all_text = ""
 
-    for i, page in enumerate(doc):
-        pix = page.get_pixmap(dpi=300)
+def _page_dpi(page, images):
+    """
+    Render resolution for OCR: the native resolution of the page's scans,
+    since rendering above it only interpolates pixels, clamped to the
+    configured range and pixel budget.
+    """
+    dpi = max((dpi for _, dpi in images), default=OCR_FROM_PDF_DPI)
+    dpi = min(max(dpi, OCR_MIN_DPI), OCR_MAX_DPI)
+
+    # Keep very large pages within the pixel budget
+    inches = (page.rect.width / 72) * (page.rect.height / 72)
+    if inches:
+        dpi = min(dpi, (OCR_MAX_PAGE_PIXELS / inches) ** 0.5)
+    return max(int(dpi), 1)
+
+
+def _ocr_page(page):
+    """OCR text of one page, or its text layer when that is good enough"""
+    images = _page_images(page)
+    text = _usable_text_layer(page, images)
+    if text is not None:
+        return text
+
+    with stage("render_page"):
+        # 8-bit grayscale is a third of the RGB size and is what Tesseract
+        # binarizes anyway
+        pix = page.get_pixmap(dpi=_page_dpi(page, images),
+                              colorspace=fitz.csGRAY, alpha=False)
+        # Wrap the pixmap samples in place: no PNG encode/decode or copy
+        img = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv,
+                               "raw", "L", pix.stride, 1)
 
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
+    try:
+        with stage("tesseract"):
+            text = get_engine().image_to_string(img)
+    finally:
+        # The image borrows the pixmap's buffer; drop it first
+        img.close()
+        del img
+        pix = None
+    OCR_CALLS.inc(kind="page")
+    return text
+
+
+def iter_ocr_pages(pdf_path):
+    """
+    Yield the text of each page of a PDF, OCR'ing only the pages that
+    need it. Only one rendered page is held in memory at a time.
+    """
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            yield f"\n--- Page {i + 1} ---\n{_ocr_page(page)}"
+            PAGES_PROCESSED.inc(operation="ocr")
 
-        text = pytesseract.image_to_string(img)
-        all_text += f"\n--- Page {i + 1} ---\n{text}"
 
-    return all_text
+@timed("ocr_from_pdf")
+def ocr_from_pdf(pdf_path):
+    return "".join(iter_ocr_pages(pdf_path))
 
 
-def perform_ocr(image):
+def _ocr_cache_key(kind, image, img_bytes):
+    """
+    Cache key from the raw image bytes (or pixels), the OCR config and the
+    engine, whose output differs slightly between backends
+    """
+    if kind == "data" and OCR_PREFILTER:
+        kind = "data-regions"
+    engine = get_engine().name
+    if img_bytes is not None:
+        return digest(kind, engine, OCR_CONFIG, img_bytes)
+    image = np.ascontiguousarray(image)
+    return digest(kind, engine, OCR_CONFIG, str(image.shape), image.tobytes())
+
+
+def perform_ocr(image, img_bytes=None):
     """
     Perform OCR on an image and return the extracted text.
 
     Parameters:
         image: The image to process (OpenCV format).
+        img_bytes: Encoded image bytes; used as the cache key and decoded
+                   only on a cache miss when image is None.
 
     Returns:
         Extracted text as a string.
     """
-    custom_config = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
-    ocr_text = pytesseract.image_to_string(image, config=custom_config)
+    key = _ocr_cache_key("string", image, img_bytes)
+    cached = ocr_cache.get(key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    if image is None:
+        image = _decode_image(img_bytes)
+    with stage("tesseract"):
+        ocr_text = get_engine().image_to_string(image, config=OCR_CONFIG)
+    OCR_CALLS.inc(kind="string")
+    ocr_cache.set(key, ocr_text.encode('utf-8'))
     return ocr_text
 
 
-def legal_redact_pdf(input_path, output_path, pii_terms=None,
-                     method="full_redact", replace_text="[REDACTED]"):
+def perform_ocr_data(image=None, img_bytes=None):
     """
-    Redact sensitive information from a PDF.
+    Perform OCR on an image and return word boxes.
 
     Parameters:
-        input_path: Path to the input PDF file
-        output_path: Path where the redacted PDF will be saved
-        pii_terms: List of terms to redact (sensitive information)
-        method: "full_redact" (remove text), "obfuscate" (black box), 
-                "replace" (text substitution)
-        replace_text: Text to insert if method="replace"
+        image: The image to process (OpenCV format).
+        img_bytes: Encoded image bytes; used as the cache key and decoded
+                   only on a cache miss when image is None.
+
+    Returns:
+        Tesseract image_to_data output as a dict of lists.
     """
-    if pii_terms is None:
-        pii_terms = []
+    key = _ocr_cache_key("data", image, img_bytes)
+    cached = ocr_cache.get_json(key)
+    if cached is not None:
+        return cached
+
+    if image is None:
+        image = _decode_image(img_bytes)
+    if OCR_PREFILTER:
+        ocr_result = _ocr_data_in_regions(image)
+    else:
+        ocr_result = _ocr_data(image)
+    ocr_cache.set_json(key, ocr_result)
+    return ocr_result
+
+
+def _ocr_data(image):
+    with stage("tesseract"):
+        ocr_result = get_engine().image_to_data(image, config=OCR_CONFIG)
+    OCR_CALLS.inc(kind="data")
+    return ocr_result
+
+
+def _ocr_data_in_regions(image):
+    """
+    image_to_data limited to the regions find_text_regions flags as text.
+    Word boxes are shifted back to full-image coordinates and each region's
+    blocks are numbered apart, so lines from different crops never merge.
+    """
+    with stage("text_detection"):
+        regions = find_text_regions(image)
+
+    height, width = image.shape[:2]
+    if regions == [(0, 0, width, height)]:
+        OCR_PREFILTER_RESULTS.inc(result="full")
+        return _ocr_data(image)
+
+    ocr_result = {column: [] for column in TSV_COLUMNS}
+    if not regions:
+        OCR_PREFILTER_RESULTS.inc(result="skipped")
+        return ocr_result
+
+    OCR_PREFILTER_RESULTS.inc(result="cropped")
+    for region_index, (x, y, w, h) in enumerate(regions):
+        region_result = _ocr_data(image[y:y + h, x:x + w])
+        offsets = {'left': x, 'top': y,
+                   'block_num': region_index * _REGION_BLOCK_STRIDE}
+        for column in TSV_COLUMNS:
+            values = region_result.get(column, [])
+            offset = offsets.get(column)
+            if offset:
+                values = [value + offset for value in values]
+            ocr_result[column].extend(values)
+
+    return ocr_result
+
+
+def _decode_image(img_bytes, flags=cv2.IMREAD_COLOR):
+    """
+    Decode embedded image bytes into an OpenCV array (BGR by default;
+    IMREAD_UNCHANGED keeps gray, alpha and 16-bit images as they are).
+    EXIF orientation is ignored: PDF viewers and the OCR boxes use the
+    stored pixel layout.
+    """
+    image = cv2.imdecode(np.frombuffer(img_bytes, np.uint8),
+                         flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is not None:
+        return image
+
+    # Formats OpenCV cannot read (e.g. JPEG 2000 without OpenJPEG)
+    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def _line_rects(words, runs):
+    """
+    Redaction rects for (first, last) runs of a page's fitz "words", one
+    rect per text line a run touches.
+    """
+    rects = []
+    for first, last in runs:
+        line_key = None
+        line_rect = None
+        for word in words[first:last + 1]:
+            key = (word[5], word[6])
+            rect = fitz.Rect(word[:4])
+            if key != line_key:
+                if line_rect is not None:
+                    rects.append(line_rect)
+                line_key = key
+                line_rect = rect
+            else:
+                line_rect |= rect
+        rects.append(line_rect)
+    return rects
+
+
+def _term_rects(matcher, words):
+    """Redaction rects for every term match in a page's fitz words"""
+    return _line_rects(words, matcher.match_words(
+        [word[4] for word in words], groups=[word[5] for word in words]))
+
+
+def _index_runs(indices):
+    """Collapse word indices into (first, last) runs of consecutive words"""
+    runs = []
+    for index in sorted(indices):
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+def locate_spans(document, spans):
+    """
+    Turn analyzer spans over document.text into the words to redact.
+
+    Parameters:
+        document: ExtractedDocument the spans were found in
+        spans: (start, end) character offsets into document.text
+
+    Returns:
+        (page words, image words): page number -> set of indices into that
+        page's fitz words, and image xref -> set of indices into its OCR
+        result
+    """
+    page_words = {}
+    image_words = {}
+    for start, end in spans:
+        for location in document.locate(start, end):
+            if location.xref is None:
+                page_words.setdefault(location.page, set()).add(location.index)
+            else:
+                image_words.setdefault(location.xref, set()).add(location.index)
+    return page_words, image_words
+
+
+def _replace_image(page, xref, stream):
+    """
+    page.replace_image without its leftover copy: replace_image adds the new
+    image to the page as a second XObject and copies it over xref, so the
+    copy stays referenced and only garbage=4 (stream deduplication) would
+    remove it. Dropping the reference lets any save discard it.
+
+    Pages that inherit /Resources from the page tree are left to plain
+    replace_image: there is no page-level dictionary to edit, and writing
+    one would hide the inherited fonts and images.
+    """
+    doc = page.parent
+    if doc.xref_get_key(page.xref, "Resources")[0] == "null":
+        page.replace_image(xref, stream=stream)
+        return
+
+    names = {img[7] for img in page.get_images(full=True)}
+    page.replace_image(xref, stream=stream)
+    for img in page.get_images(full=True):
+        if img[7] not in names:
+            target, key = _xobject_dict(doc, page)
+            doc.xref_set_key(target, f"{key}{img[7]}", "null")
 
-    doc = fitz.open(input_path)
+
+def _xobject_dict(doc, page):
+    """
+    (xref, key prefix) of the XObject dictionary of the page's own
+    /Resources, following indirect references
+    """
+    target, key = page.xref, "Resources/"
+    kind, value = doc.xref_get_key(page.xref, "Resources")
+    if kind == "xref":
+        target, key = int(value.split()[0]), ""
+    kind, value = doc.xref_get_key(target, f"{key}XObject")
+    if kind == "xref":
+        return int(value.split()[0]), ""
+    return target, f"{key}XObject/"
+
+
+def _redact_pages(doc, start, end, matcher, method, replace_text,
+                  document=None, located=None):
+    """
+    Redact the text and image layers of pages [start, end) in place.
+
+    With located (from locate_spans) only those words are redacted; matcher
+    is then used just for images whose extracted OCR cannot be reused.
+    """
+    ocr_results = {}
+    page_words = {}
+    if document is not None:
+        ocr_results = document.ocr_by_xref()
+        page_words = {page.number: page.words for page in document.pages}
 
     # Process all pages first
-    for page_num, page in enumerate(doc):
+    for page_num in range(start, end):
+        page = doc[page_num]
         # --- TEXT LAYER PROCESSING ---
-        for term in pii_terms:
-            areas = page.search_for(term)
-
-            for rect in areas:
-                if method == "replace":
-                    page.add_redact_annot(rect, text=replace_text)
-                elif method == "obfuscate":
-                    page.add_redact_annot(rect, fill=(0, 0, 0))
-                else:  # full legal redaction
-                    page.add_redact_annot(rect, text="")
+        rects = []
+        if located is not None:
+            indices = located[0].get(page_num)
+            if indices:
+                rects = _line_rects(page_words[page_num], _index_runs(indices))
+        elif matcher:
+            words = page_words.get(page_num)
+            if words is None:
+                words = page.get_text("words")
+            rects = _term_rects(matcher, words)
+
+        for rect in rects:
+            if method == "replace":
+                page.add_redact_annot(rect, text=replace_text)
+            elif method == "obfuscate":
+                page.add_redact_annot(rect, fill=(0, 0, 0))
+            else:  # full legal redaction
+                page.add_redact_annot(rect, text="")
 
         # Apply text redactions
-        page.apply_redactions()
+        with stage("apply_redactions"):
+            page.apply_redactions()
 
     # --- IMAGE LAYER PROCESSING --- (separate pass to avoid xref conflicts)
-    for page_num, page in enumerate(doc):
+    processed_xrefs = set()
+    for page_num in range(start, end):
+        page = doc[page_num]
         for img in page.get_images(full=True):
             xref = img[0]
 
+            # replace_image updates the image on every page that shows it
+            if xref in processed_xrefs:
+                continue
+            processed_xrefs.add(xref)
+
             try:
                 base_image = doc.extract_image(xref)
                 if base_image:
                     img_bytes = base_image["image"]
-                    pix = fitz.Pixmap(img_bytes)
-
-                    # Process image (assuming process_image_with_ocr is defined elsewhere)
-                    # This function should return image bytes after OCR and redaction
-                    if callable(process_image_with_ocr):
-                        processed_bytes = process_image_with_ocr(
-                            img_bytes,
-                            pii_terms,
-                            method=method,
-                            replace_text=replace_text
-                        )
-
-                        # Create a new pixmap from processed bytes
-                        new_pix = fitz.Pixmap(processed_bytes)
-
-                        # Replace the image - safer approach
-                        doc.delete_image(xref)  # Remove old image
-                        new_xref = doc.add_image_ref(
-                            new_pix.tobytes())  # Add new image
-
-                        # Update the image reference in the page
-                        page.replace_image(xref, new_xref)
+
+                    # Reuse the word boxes found during extraction unless the
+                    # text pass changed the image dimensions
+                    ocr_result = None
+                    image_content = ocr_results.get(xref)
+                    if image_content and (image_content.width, image_content.height) == \
+                            (base_image["width"], base_image["height"]):
+                        ocr_result = image_content.ocr
+
+                    with stage("redact_image"):
+                        if located is not None and ocr_result is not None:
+                            processed_bytes = redact_image_words(
+                                img_bytes,
+                                ocr_result,
+                                located[1].get(xref, ()),
+                                method=method,
+                                replace_text=replace_text
+                            )
+                        else:
+                            processed_bytes = process_image_with_ocr(
+                                img_bytes,
+                                matcher,
+                                method=method,
+                                replace_text=replace_text,
+                                ocr_result=ocr_result
+                            )
+
+                    # Nothing matched, keep the original image stream
+                    if processed_bytes is img_bytes:
+                        continue
+
+                    _replace_image(page, xref, processed_bytes)
             except Exception as e:
                 print(f"Error processing image on page {page_num+1}: {str(e)}")
                 continue
 
+
+def _redact_page_range(input_path, start, end, matcher, method,
+                       replace_text, document=None, located=None):
+    """
+    Worker entry point: open a private handle on the PDF, redact pages
+    [start, end) and return just those pages as PDF bytes.
+    """
+    doc = fitz.open(input_path)
+    _redact_pages(doc, start, end, matcher, method, replace_text, document,
+                  located)
+    doc.select(list(range(start, end)))
+    pdf_bytes = doc.tobytes(garbage=1)
+    doc.close()
+    return pdf_bytes
+
+
+def legal_redact_pdf(input_path, output_path, pii_terms=None,
+                     method="full_redact", replace_text="[REDACTED]",
+                     workers=None, document=None, spans=None, profile=None):
+    """
+    Redact sensitive information from a PDF.
+
+    Either pii_terms are searched for and every occurrence is redacted, or
+    spans (analyzer offsets into document.text) are mapped straight to the
+    words they cover, so only the detected occurrences are redacted and no
+    search pass over the document is needed.
+
+    Parameters:
+        input_path: Path to the input PDF file
+        output_path: Path where the redacted PDF will be saved, or a
+                     writable binary file object (e.g. io.BytesIO)
+        pii_terms: List of terms to redact (sensitive information)
+        method: "full_redact" (remove text), "obfuscate" (black box), 
+                "replace" (text substitution)
+        replace_text: Text to insert if method="replace"
+        workers: Number of worker processes that redact page ranges in
+                 parallel (defaults to PDF_WORKERS, 1 means serial)
+        document: ExtractedDocument from extract_document; its OCR word
+                  boxes are reused so images are not OCR'd again
+        spans: (start, end) offsets into document.text to redact instead
+               of searching for pii_terms; requires document
+        profile: Output profile from SAVE_PROFILES (defaults to
+                 REDACTION_SAVE_PROFILE)
+    """
+    profile = profile or REDACTION_SAVE_PROFILE
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile: {profile}")
+
+    located = None
+    if spans is not None:
+        if document is None:
+            raise ValueError("Span redaction needs the extracted document")
+        located = locate_spans(document, spans)
+        # Only used for images whose extracted OCR no longer applies
+        pii_terms = [document.text[start:end] for start, end in spans]
+    elif pii_terms is None:
+        pii_terms = []
+
+    # One automaton for all terms, shared by the text and image passes
+    matcher = TermMatcher(pii_terms)
+
+    page_count = _page_count(input_path)
+    workers = _resolve_workers(workers, page_count)
+
+    with stage("redact_pages"):
+        if workers == 1:
+            doc = fitz.open(input_path)
+            _redact_pages(doc, 0, page_count, matcher, method, replace_text,
+                          document, located)
+        else:
+            # Each worker returns its redacted pages; stitch them back in order
+            doc = fitz.open()
+            for pdf_bytes in _run_page_ranges(_redact_page_range, input_path,
+                                              page_count, workers, matcher,
+                                              method, replace_text, document,
+                                              located):
+                with fitz.open("pdf", pdf_bytes) as part:
+                    doc.insert_pdf(part)
+    PAGES_PROCESSED.inc(page_count, operation="redact")
+
     # Remove metadata and sensitive tags
     doc.set_metadata({})
 
@@ -161,56 +693,145 @@ def legal_redact_pdf(input_path, output_path, pii_terms=None,
         except:
             pass
 
-    # Save with security settings
-    doc.save(output_path,
-             deflate=True,
-             garbage=4,  # Maximum cleanup of unused objects
-             clean=True)  # Sanitize content
+    with stage("save_pdf"):
+        doc.save(output_path, **SAVE_PROFILES[profile])
     doc.close()
 
+    if hasattr(output_path, "write"):
+        output_size = output_path.tell()
+    else:
+        output_size = os.path.getsize(output_path)
+    BYTES_PROCESSED.inc(output_size, direction="out")
 
-def process_image_with_ocr(img_bytes, pii_terms, method, replace_text):
-    """Process image with OCR and redaction"""
-    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    open_cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+def process_image_with_ocr(img_bytes, pii_terms, method, replace_text,
+                           ocr_result=None):
+    """
+    Process image with OCR and redaction.
+
+    pii_terms is a list of terms or a prebuilt TermMatcher. ocr_result can
+    carry image_to_data output from extract_document so the image is not
+    OCR'd a second time. Returns img_bytes unchanged when no PII was found
+    in the image.
+    """
+    matcher = pii_terms if isinstance(pii_terms, TermMatcher) \
+        else TermMatcher(pii_terms)
 
     # Enhanced OCR processing
-    custom_config = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
-    ocr_result = pytesseract.image_to_data(
-        open_cv_image,
-        config=custom_config,
-        output_type=pytesseract.Output.DICT
-    )
-
-    for i in range(len(ocr_result['text'])):
-        text = ocr_result['text'][i]
-        if any(term.lower() in text.lower() for term in pii_terms):
-            x, y, w, h = (
-                ocr_result['left'][i],
-                ocr_result['top'][i],
-                ocr_result['width'][i],
-                ocr_result['height'][i]
-            )
+    if ocr_result is None:
+        ocr_result = perform_ocr_data(img_bytes=img_bytes)
 
-            if method == "replace":
-                # White background + new text
-                cv2.rectangle(open_cv_image, (x, y),
-                              (x+w, y+h), (255, 255, 255), -1)
-                cv2.putText(
-                    open_cv_image,
-                    replace_text,
-                    (x, y+h//2),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 0, 0),
-                    1
-                )
-            elif method == "obfuscate":
-                cv2.rectangle(open_cv_image, (x, y), (x+w, y+h), (0, 0, 0), -1)
-            else:  # full redaction
-                cv2.rectangle(open_cv_image, (x, y),
-                              (x+w, y+h), (255, 255, 255), -1)
-
-    # Convert back to bytes
-    _, img_encoded = cv2.imencode('.png', open_cv_image)
-    return img_encoded.tobytes()
+    # One scan over all OCR words instead of a term-by-term check per word;
+    # terms span words and lines of a paragraph but not separate blocks
+    word_indices = [i for i, text in enumerate(ocr_result['text'])
+                    if text and text.strip()]
+    paragraphs = [(ocr_result['block_num'][i], ocr_result['par_num'][i])
+                  for i in word_indices]
+    matched = set()
+    for first, last in matcher.match_words(
+            [ocr_result['text'][i] for i in word_indices], groups=paragraphs):
+        matched.update(word_indices[first:last + 1])
+
+    return redact_image_words(img_bytes, ocr_result, matched, method,
+                              replace_text)
+
+
+def _ocr_boxes(ocr_result, indices):
+    """
+    (N, 4) int array of x0, y0, x1, y1 (inclusive) boxes covering the OCR
+    words at indices. Neighbouring words of the same text line share one
+    box, so the gaps inside a multi-word match are covered too.
+    """
+    indices = np.fromiter(sorted(indices), dtype=np.intp)
+    left = np.asarray(ocr_result['left'], dtype=np.int64)[indices]
+    top = np.asarray(ocr_result['top'], dtype=np.int64)[indices]
+    right = left + np.asarray(ocr_result['width'], dtype=np.int64)[indices]
+    bottom = top + np.asarray(ocr_result['height'], dtype=np.int64)[indices]
+
+    # A new box starts wherever the next word is not the next OCR entry on
+    # the same line
+    lines = np.stack([np.asarray(ocr_result[column], dtype=np.int64)[indices]
+                      for column in ('block_num', 'par_num', 'line_num')])
+    starts = np.ones(len(indices), dtype=bool)
+    starts[1:] = ((np.diff(indices) != 1)
+                  | (lines[:, 1:] != lines[:, :-1]).any(axis=0))
+    run_starts = np.flatnonzero(starts)
+
+    return np.stack([np.minimum.reduceat(left, run_starts),
+                     np.minimum.reduceat(top, run_starts),
+                     np.maximum.reduceat(right, run_starts),
+                     np.maximum.reduceat(bottom, run_starts)], axis=1)
+
+
+def _box_mask(boxes, shape):
+    """
+    uint8 mask (255 inside) of the union of boxes. Boxes are drawn one by
+    one: cv2.fillPoly with several polygons leaves their overlaps empty.
+    """
+    mask = np.zeros(shape, dtype=np.uint8)
+    for x0, y0, x1, y1 in boxes.tolist():
+        cv2.rectangle(mask, (x0, y0), (x1, y1), 255, -1)
+    return mask
+
+
+def _fill_scalar(image, level):
+    """cv2 scalar for black (level 0) or white (level 1) in image's format"""
+    top = np.iinfo(image.dtype).max
+    value = top * level
+    # Keep filled pixels opaque
+    if image.ndim == 3 and image.shape[2] == 4:
+        return (value, value, value, top)
+    return (value, value, value, value)
+
+
+def _fill_masked(image, mask, scalar):
+    """Set every masked pixel to scalar in place, in one pass per operation"""
+    cv2.subtract(image, image, dst=image, mask=mask)
+    if any(scalar):
+        cv2.add(image, scalar, dst=image, mask=mask)
+
+
+def _encode_like(image, img_bytes):
+    """
+    Encode image in the format of the original bytes: JPEG stays JPEG (and
+    is embedded as is), anything else becomes PNG.
+    """
+    if img_bytes[:2] == b"\xff\xd8" and image.dtype == np.uint8:
+        ok, encoded = cv2.imencode(
+            '.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, _JPEG_QUALITY])
+    else:
+        ok, encoded = cv2.imencode('.png', image)
+    if not ok:
+        raise ValueError("Could not encode redacted image")
+    return encoded.tobytes()
+
+
+def redact_image_words(img_bytes, ocr_result, indices, method, replace_text):
+    """
+    Cover the OCR words at indices (into ocr_result) in an image.
+
+    All boxes are combined into one mask that is filled in a single
+    masked operation; the image keeps its channels, bit depth and (for
+    JPEG) encoding.
+
+    Returns img_bytes unchanged when there is nothing to cover.
+    """
+    if not indices:
+        return img_bytes
+
+    image = _decode_image(img_bytes, cv2.IMREAD_UNCHANGED)
+    boxes = _ocr_boxes(ocr_result, indices)
+
+    # Black boxes for obfuscation, white for full redaction and replace
+    level = 0 if method == "obfuscate" else 1
+    _fill_masked(image, _box_mask(boxes, image.shape[:2]),
+                 _fill_scalar(image, level))
+
+    if method == "replace":
+        # New text on the white boxes
+        color = _fill_scalar(image, 0)
+        for x0, y0, _, y1 in boxes.tolist():
+            cv2.putText(image, replace_text, (x0, (y0 + y1) // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+    return _encode_like(image, img_bytes)
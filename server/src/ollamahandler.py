@@ -1,65 +1,236 @@
 import json
 import logging
+import threading
 import time
+from concurrent.futures import (ThreadPoolExecutor, FIRST_COMPLETED,
+                                as_completed, wait)
+import httpx
 import ollama
-from src.config import SYSTEM_PROMPT
-from src.preprocessor import clean_llm_json_response, clean_empty_values
+from src.config import (SYSTEM_PROMPT, OLLAMA_MODEL, OLLAMA_CONCURRENCY,
+                        OLLAMA_TIMEOUT, OLLAMA_FORMAT, OLLAMA_MAX_RETRIES,
+                        OLLAMA_RETRY_BACKOFF)
+from src.preprocessor import (clean_empty_values, parse_llm_json,
+                              JsonStreamScanner)
+from src.metrics import stage, LLM_REQUESTS, LLM_TOKENS, LLM_OUTCOMES
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+RETRY_REMINDER = "Return only the JSON object, with double quotes and valid syntax."
+
+
 class OllamaClient:
-    def __init__(self, model: str = "llama3.2:latest"):
+    def __init__(self, model: str = OLLAMA_MODEL, host: str | None = None,
+                 timeout: float = OLLAMA_TIMEOUT,
+                 concurrency: int = OLLAMA_CONCURRENCY,
+                 format: str | dict | None = OLLAMA_FORMAT):
         self.model = model
-        self.messages = []
-        self.update_chat("system", SYSTEM_PROMPT)
+        self.concurrency = concurrency
+        # "json" or a JSON schema dict makes Ollama constrain decoding
+        self.format = format or None
+        # One pooled HTTP client shared by every request and thread; the
+        # timeout applies to each request separately
+        self.client = ollama.Client(
+            host=host,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max(concurrency, 1),
+                                max_keepalive_connections=max(concurrency, 1))
+        )
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "eval_tokens": 0,
+            "eval_seconds": 0.0,
+            "wall_seconds": 0.0,
+            "early_stops": 0,
+            "repairs": 0,
+            "parse_failures": 0,
+            "retries": 0,
+        }
 
-    def update_chat(self, role: str, content: str):
-        """Append a message to the conversation history."""
-        self.messages.append({"role": role, "content": content})
+    def new_conversation(self, content: str) -> list[dict]:
+        """Start a fresh conversation holding only the system prompt and content."""
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": content},
+        ]
 
-    def prompt_model(self) -> str:
-        """Send the chat to the model and return the response string."""
+    def prompt_model(self, messages: list[dict]) -> str:
+        """
+        Stream the chat from the model and return the response string.
+
+        Tokens are consumed as they arrive. With a constrained output
+        format the stream is closed as soon as a complete top-level JSON
+        value has been received, so trailing output is never generated.
+        Unconstrained output is read to the end: a bracket in a preamble
+        such as "Here is the [report]" would look like a complete value.
+        """
         logger.debug("Sending prompt to model...")
-        response = ollama.chat(model=self.model, messages=self.messages)
-        return response['message']['content']
+        start = time.perf_counter()
+        scanner = JsonStreamScanner() if self.format else None
+        parts = []
+        final = None
+
+        with stage("llm_request"):
+            stream = self.client.chat(
+                model=self.model,
+                messages=messages,
+                format=self.format,
+                stream=True)
+            try:
+                for chunk in stream:
+                    content = chunk['message']['content']
+                    end = scanner.feed(content) if scanner else -1
+                    if chunk.get('done'):
+                        final = chunk
+                    if end != -1:
+                        parts.append(content[:end])
+                        break
+                    parts.append(content)
+            finally:
+                # Closing the response makes the server stop generating
+                stream.close()
+
+        self._record(final, len(parts), time.perf_counter() - start)
+        return "".join(parts)
+
+    def _record(self, final, chunks: int, wall_seconds: float):
+        LLM_REQUESTS.inc(model=self.model)
+        if final is not None:
+            LLM_TOKENS.inc(final.get("prompt_eval_count") or 0,
+                           model=self.model, type="prompt")
+            LLM_TOKENS.inc(final.get("eval_count") or 0,
+                           model=self.model, type="eval")
+        else:
+            LLM_TOKENS.inc(chunks, model=self.model, type="eval")
 
-    def get_structured_data(self, content: str, max_retries: int = 5, delay: int = 2) -> dict | None:
-        """Attempt to retrieve and parse structured JSON data from LLM."""
-        self.update_chat("user", content)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["wall_seconds"] += wall_seconds
+            if final is not None:
+                self.stats["prompt_tokens"] += final.get("prompt_eval_count") or 0
+                self.stats["eval_tokens"] += final.get("eval_count") or 0
+                self.stats["eval_seconds"] += (final.get("eval_duration") or 0) / 1e9
+            else:
+                # Stopped early: the server never sent its final counters,
+                # so count one token per streamed chunk
+                self.stats["early_stops"] += 1
+                self.stats["eval_tokens"] += chunks
+                self.stats["eval_seconds"] += wall_seconds
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def tokens_per_second(self) -> float:
+        """Generation throughput over every request made by this client."""
+        with self._stats_lock:
+            if not self.stats["eval_seconds"]:
+                return 0.0
+            return self.stats["eval_tokens"] / self.stats["eval_seconds"]
+
+    def get_structured_data(self, content: str, max_retries: int = OLLAMA_MAX_RETRIES,
+                            delay: float = OLLAMA_RETRY_BACKOFF) -> dict | None:
+        """
+        Attempt to retrieve and parse structured JSON data from LLM.
+
+        Malformed output is repaired locally first. Only output that cannot
+        be repaired is regenerated, with exponential backoff starting at
+        delay seconds.
+        """
+        # Each document gets its own conversation, so earlier documents and
+        # their retry feedback never inflate this prompt
+        messages = self.new_conversation(content)
 
         for attempt in range(1, max_retries + 1):
             logger.info(f"Attempt {attempt}: Getting structured data...")
 
-            raw_output = self.prompt_model().strip()
-            cleaned_output = clean_llm_json_response(raw_output)
+            raw_output = self.prompt_model(messages).strip()
 
             try:
-                parsed_data = json.loads(cleaned_output)
-                parsed_data = clean_empty_values(parsed_data)
-                logger.info("Successfully parsed JSON.")
-                return parsed_data
-
+                parsed_data, repaired = parse_llm_json(raw_output)
             except json.JSONDecodeError as e:
+                self._count("parse_failures")
+                LLM_OUTCOMES.inc(outcome="invalid")
                 logger.warning(f"JSON decoding failed: {e}")
-                logger.debug(f"Raw LLM output:\n{cleaned_output}")
-
-                feedback = (
-                    "The previous response was not valid JSON. "
-                    f"Error: {e}"
-                    f"Here is the invalid response:\n{cleaned_output}"
-                    "Please return only valid JSON with double quotes and proper syntax."
-                )
-                self.update_chat("user", feedback)
-
-                if attempt < max_retries:
-                    time.sleep(delay)
-                else:
+                logger.debug(f"Raw LLM output:\n{raw_output}")
+
+                if attempt == max_retries:
+                    LLM_OUTCOMES.inc(outcome="failed")
                     logger.error(
                         "Max retries reached. Failed to get valid JSON.")
                     return None
 
+                # Regenerate with a short fixed reminder instead of feeding
+                # the invalid output back into the prompt
+                self._count("retries")
+                messages = self.new_conversation(content)
+                messages.append({"role": "user", "content": RETRY_REMINDER})
+                time.sleep(delay * 2 ** (attempt - 1))
+                continue
+
+            if repaired:
+                self._count("repairs")
+                LLM_OUTCOMES.inc(outcome="repaired")
+                logger.info("Repaired malformed JSON locally.")
+            else:
+                LLM_OUTCOMES.inc(outcome="parsed")
+                logger.info("Successfully parsed JSON.")
+            return clean_empty_values(parsed_data)
+
+    def _extract_indexed(self, index: int, content: str):
+        try:
+            return index, self.get_structured_data(content), None
+        except Exception as e:
+            logger.error(f"Structured extraction failed for document {index}: {e}")
+            return index, None, str(e)
+
+    def iter_structured_data(self, contents):
+        """
+        Extract structured data for several documents concurrently.
+
+        Up to self.concurrency requests run at once over the pooled client.
+        contents is consumed lazily, so producing the next text (e.g. OCR)
+        overlaps with the requests already in flight. A request that fails
+        or times out does not stop the others.
+
+        Parameters:
+            contents: Iterable of document texts
+
+        Yields:
+            (index, structured data, error message or None) in completion
+            order
+        """
+        start = time.perf_counter()
+        count = 0
+
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1)) as pool:
+            pending = set()
+            for index, content in enumerate(contents):
+                pending.add(pool.submit(self._extract_indexed, index, content))
+                count += 1
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+            for future in as_completed(pending):
+                yield future.result()
+
+        logger.info(
+            f"Extracted {count} documents in "
+            f"{time.perf_counter() - start:.1f}s "
+            f"({self.tokens_per_second():.1f} tokens/sec)")
+
+    def get_structured_data_batch(self, contents: list[str]) -> list[dict | None]:
+        """Extract structured data for several documents, in input order."""
+        results = [None] * len(contents)
+        for index, data, _ in self.iter_structured_data(contents):
+            results[index] = data
+        return results
+
 
 # def get_entities(text: str) -> list[str]:
 #     """
@@ -1,3 +1,4 @@
+import json
 import re
 
 
@@ -28,3 +29,221 @@ def clean_empty_values(data):
         ]
     else:
         return data
+
+
+_LITERALS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "null", "Infinity": "null", "-Infinity": "null",
+}
+_TOKEN_CHARS = re.compile(r"[A-Za-z0-9_.+\-]")
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """
+    Whether a quote is a real closing quote rather than an unescaped quote
+    inside the string: it must be followed by a delimiter or the end.
+    """
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i == len(text) or text[i] in ',:}]"\''
+
+
+def repair_json(raw: str) -> str:
+    """
+    Repair the JSON breakages LLMs commonly produce, in a single pass.
+
+    Handles text around the JSON value, single-quoted strings, raw newlines
+    and control characters inside strings, unquoted keys, Python literals,
+    missing and trailing commas, // comments, and output truncated in the
+    middle of a string, key or nested value. The result is not guaranteed
+    to parse; json.loads has the final say.
+    """
+    text = clean_llm_json_response(raw)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+
+    out = []
+    stack = []
+    in_string = False
+    quote = None
+    escape = False
+    # Last significant token outside strings: one of "{[,:" or "v" (value)
+    last = None
+    # True while the string being read (or just read) is an object key
+    key_pending = False
+
+    def value_starts():
+        # Insert a missing comma between two consecutive values
+        if last == "v":
+            out.append(",")
+
+    i = min(starts)
+    while i < len(text):
+        ch = text[i]
+
+        if in_string:
+            if escape:
+                out.append(ch)
+                escape = False
+            elif ch == "\\":
+                out.append(ch)
+                escape = True
+            elif ch == quote and _closes_string(text, i + 1):
+                out.append('"')
+                in_string = False
+                last = "v"
+            elif ch == '"':
+                out.append('\\"')
+            elif ch in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[ch])
+            elif ord(ch) < 0x20:
+                out.append(f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            value_starts()
+            key_pending = bool(stack) and stack[-1] == "{" and last in ("{", ",", "v")
+            in_string = True
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            value_starts()
+            stack.append(ch)
+            out.append(ch)
+            last = ch
+            key_pending = False
+        elif ch in "}]":
+            if not stack:
+                break
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()
+            if key_pending:
+                out.append(": null")
+                key_pending = False
+            elif last == ":":
+                out.append(" null")
+            out.append("}" if stack.pop() == "{" else "]")
+            last = "v"
+            if not stack:
+                # Ignore anything after the top-level value
+                break
+        elif ch == ",":
+            if last not in (",", "{", "[", ":", None):
+                out.append(",")
+                last = ","
+            key_pending = False
+        elif ch == ":":
+            out.append(":")
+            last = ":"
+            key_pending = False
+        elif ch.isspace():
+            out.append(ch)
+        elif ch == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        elif _TOKEN_CHARS.match(ch):
+            end = i
+            while end < len(text) and _TOKEN_CHARS.match(text[end]):
+                end += 1
+            token = text[i:end]
+            value_starts()
+            if stack and stack[-1] == "{" and last in ("{", ","):
+                # Unquoted object key
+                out.append(json.dumps(token))
+                key_pending = True
+            else:
+                out.append(_LITERALS.get(token, token))
+            last = "v"
+            i = end
+            continue
+        i += 1
+
+    # Truncated output: close the open string, key and containers
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+        last = "v"
+    while out and (out[-1].isspace() or out[-1] == ","):
+        out.pop()
+    if stack:
+        if key_pending:
+            out.append(": null")
+        elif last == ":":
+            out.append(" null")
+    for opener in reversed(stack):
+        out.append("}" if opener == "{" else "]")
+
+    return "".join(out)
+
+
+def parse_llm_json(raw: str):
+    """
+    Parse model output as JSON, repairing it locally if needed.
+
+    Returns:
+        (parsed value, True if a repair was needed)
+
+    Raises:
+        json.JSONDecodeError if the output cannot be repaired.
+    """
+    cleaned = clean_llm_json_response(raw)
+    try:
+        return json.loads(cleaned), False
+    except json.JSONDecodeError:
+        return json.loads(repair_json(cleaned)), True
+
+
+class JsonStreamScanner:
+    """
+    Tracks nesting of a JSON document arriving in chunks so a streamed
+    generation can be stopped as soon as the top-level value is closed.
+
+    The value is taken to start at the first "{" or "[", so this is only
+    reliable for output that starts with the JSON (e.g. format="json").
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.quote = None
+
+    def feed(self, chunk: str) -> int:
+        """
+        Consume a chunk.
+
+        Returns:
+            Index just past the end of the top-level value inside chunk, or
+            -1 if it has not been closed yet.
+        """
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == self.quote:
+                    self.in_string = False
+            elif not self.started:
+                if ch in "{[":
+                    self.started = True
+                    self.depth = 1
+            elif ch in "\"'":
+                self.in_string = True
+                self.quote = ch
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
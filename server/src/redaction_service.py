@@ -1,10 +1,203 @@
 # redaction_service.py
+import io
 import os
-from src.ocr_redaction import print_contents, legal_redact_pdf
-from src.model import analyze_text_from_string
+import time
+from contextlib import contextmanager
+from src.cache import DiskCache, digest
+from src.content_store import file_digest
+from src.ocr_redaction import (extract_document, legal_redact_pdf,
+                               OCR_CONFIG)
+from src.ocr_engine import get_engine
+from src.model import analyze_texts_entities, analyzer_version, entities_to_terms
+from src.config import (REDACTION_BATCH_DOCS, REDACTION_MATCH,
+                        REDACTION_SAVE_PROFILE, REDACTION_CACHE_ENABLED,
+                        REDACTION_CACHE_DIR, REDACTION_CACHE_MAX_BYTES,
+                        REDACTION_CACHE_TTL, OCR_LANG, OCR_PREFILTER,
+                        OCR_BACKEND)
+from src.metrics import (register_cache, BYTES_PROCESSED,
+                         DOCUMENTS_PROCESSED, STAGE_SECONDS, STAGE_ERRORS)
 
+# (input content hash, method, replace_text, settings) -> redacted PDF
+redaction_cache = DiskCache(REDACTION_CACHE_DIR, REDACTION_CACHE_MAX_BYTES,
+                            enabled=REDACTION_CACHE_ENABLED,
+                            ttl=REDACTION_CACHE_TTL)
 
-def process_pdf_redaction(input_files, output_folder, method='full_redact', replace_text='[REDACTED]'):
+# Everything besides the request that changes a redacted PDF (the OCR
+# engine "auto" resolves to is added per key)
+REDACTION_SETTINGS = (f"match={REDACTION_MATCH};ocr={OCR_CONFIG};"
+                      f"lang={OCR_LANG};prefilter={OCR_PREFILTER};"
+                      f"backend={OCR_BACKEND}")
+
+# Start from an empty cache whenever the analyzer or settings change
+redaction_cache.ensure_version(digest(analyzer_version(), REDACTION_SETTINGS))
+
+register_cache("redaction", redaction_cache)
+
+
+def _redaction_key(content_hash, method, replace_text, profile):
+    # stream and fast write the same bytes
+    if profile == "stream":
+        profile = "fast"
+    return digest(content_hash, method, replace_text, profile,
+                  REDACTION_SETTINGS, get_engine().name, analyzer_version())
+
+
+def _batches(count, batch_docs):
+    """
+    (start, end) of each batch of files: the first file on its own, so its
+    result streams out without waiting for a whole batch, then batch_docs
+    files at a time
+    """
+    batch_docs = max(batch_docs, 1)
+    start, size = 0, 1
+    while start < count:
+        end = min(start + size, count)
+        yield start, end
+        start, size = end, batch_docs
+
+
+@contextmanager
+def _redact_stage(seconds, indexes):
+    """
+    Add the block's wall time to the redact_document time of the files at
+    indexes, split evenly between them
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage="redact_document")
+        raise
+    finally:
+        elapsed = (time.perf_counter() - start) / len(indexes)
+        for index in indexes:
+            seconds[index] += elapsed
+
+
+def iter_pdf_redaction(input_files, output_folder, method='full_redact', replace_text='[REDACTED]',
+                       batch_docs=REDACTION_BATCH_DOCS, profile=REDACTION_SAVE_PROFILE,
+                       content_hashes=None):
+    """
+    Redact a batch of PDF files, yielding each result as soon as that file
+    is done
+
+    The first file is processed on its own; the rest are extracted in
+    groups of batch_docs and each group's texts are analyzed together, so
+    spaCy processes them as one batch. Each file is redacted and released
+    before the next group is extracted. Files whose contents were already
+    redacted with the same method, replace_text and settings are served
+    from the redaction cache without extraction, OCR or analysis.
+
+    Parameters:
+        input_files: List of paths to input PDF files
+        output_folder: Folder to store output files
+        method: Redaction method ('full_redact', 'obfuscate', 'replace')
+        replace_text: Text to use for replacement if method is 'replace'
+        batch_docs: Number of files analyzed per batch
+        profile: Save profile (see ocr_redaction.SAVE_PROFILES); with
+                 "stream" nothing is written to output_folder
+        content_hashes: SHA-256 of each input file, if already known
+                        (computed from the files otherwise)
+
+    Yields:
+        (file name, output) for each redacted PDF in input order, where
+        output is the path of the redacted file, or its bytes when
+        profile is "stream"
+    """
+    if content_hashes is None:
+        content_hashes = [file_digest(path) for path in input_files]
+
+    for batch_start, batch_end in _batches(len(input_files), batch_docs):
+        batch = input_files[batch_start:batch_end]
+        keys = [_redaction_key(content_hash, method, replace_text, profile)
+                for content_hash in content_hashes[batch_start:batch_end]]
+        cached = [redaction_cache.get(key) for key in keys]
+        misses = [index for index, hit in enumerate(cached) if hit is None]
+
+        # redact_document times each file's extraction, its share of the
+        # batch analysis and its redaction
+        seconds = dict.fromkeys(misses, 0.0)
+
+        # Step 1: Extract text and OCR word boxes from each PDF (once)
+        documents = {}
+        for index in misses:
+            input_path = batch[index]
+            with _redact_stage(seconds, [index]):
+                BYTES_PROCESSED.inc(os.path.getsize(input_path), direction="in")
+                documents[index] = extract_document(input_path)
+
+        # Step 2: Analyze the extracted texts together to identify PII
+        entity_lists = {}
+        if misses:
+            with _redact_stage(seconds, misses):
+                try:
+                    entity_lists = dict(zip(misses, analyze_texts_entities(
+                        [documents[index].text for index in misses])))
+                except Exception as e:
+                    raise Exception(f"Error analyzing text: {str(e)}")
+
+        for index, (input_path, key, hit) in enumerate(zip(batch, keys, cached)):
+            # Get the base filename
+            base_filename = os.path.basename(input_path)
+            file_id = os.path.splitext(base_filename)[0]
+
+            # Define path for the output file
+            output_name = f"{file_id}_redacted.pdf"
+
+            if hit is not None:
+                if profile == "stream":
+                    yield output_name, hit
+                    continue
+                output = os.path.join(output_folder, output_name)
+                with open(output, 'wb') as f:
+                    f.write(hit)
+                yield output_name, output
+                continue
+
+            # Release each document (and its OCR word boxes) once redacted
+            document = documents.pop(index)
+            entities = entity_lists.pop(index)
+            if profile == "stream":
+                output = io.BytesIO()
+            else:
+                output = os.path.join(output_folder, output_name)
+
+            pii_terms = entities_to_terms(document.text, entities)
+            print(f"Identified PII in {base_filename}: {pii_terms}")
+
+            # Redact the analyzer's spans directly, or every occurrence of
+            # the detected strings
+            spans = None
+            if REDACTION_MATCH == "spans":
+                spans = [(entity.start, entity.end) for entity in entities]
+
+            # Step 3: Perform redaction
+            with _redact_stage(seconds, [index]):
+                legal_redact_pdf(
+                    input_path,
+                    output,
+                    pii_terms=pii_terms,
+                    method=method,
+                    replace_text=replace_text,
+                    document=document,
+                    spans=spans,
+                    profile=profile
+                )
+            del document
+            STAGE_SECONDS.observe(seconds.pop(index), stage="redact_document")
+            DOCUMENTS_PROCESSED.inc(operation="redact")
+
+            if profile == "stream":
+                output = output.getvalue()
+                redaction_cache.set(key, output)
+            elif redaction_cache.enabled:
+                with open(output, 'rb') as f:
+                    redaction_cache.set(key, f.read())
+            yield output_name, output
+
+
+def process_pdf_redaction(input_files, output_folder, method='full_redact', replace_text='[REDACTED]',
+                          progress=None):
     """
     Process a batch of PDF files for redaction
 
@@ -13,47 +206,22 @@ def process_pdf_redaction(input_files, output_folder, method='full_redact', repl
         output_folder: Folder to store output files
         method: Redaction method ('full_redact', 'obfuscate', 'replace')
         replace_text: Text to use for replacement if method is 'replace'
+        progress: Optional callback progress(index, output_path) called
+                  after each file is redacted
 
     Returns:
         List of paths to redacted PDF files
     """
     output_paths = []
 
-    for input_path in input_files:
-        # Get the base filename
-        base_filename = os.path.basename(input_path)
-        file_id = os.path.splitext(base_filename)[0]
-
-        # Define paths for intermediate and output files
-        extracted_text_path = os.path.join(
-            output_folder, f"{file_id}_extracted.txt")
-        output_path = os.path.join(output_folder, f"{file_id}_redacted.pdf")
-
-        # Step 1: Extract text from PDF
-        print_contents(input_path, extracted_text_path)
-
-        # Step 2: Analyze extracted text to identify PII
-        try:
-            with open(extracted_text_path, 'r', encoding='utf-8') as file:
-                text_content = file.read()
-            pii_terms = analyze_text_from_string(text_content)
-        except Exception as e:
-            raise Exception(f"Error analyzing text: {str(e)}")
-
-        # Step 3: Perform redaction
-        legal_redact_pdf(
-            input_path,
-            output_path,
-            pii_terms=pii_terms,
-            method=method,
-            replace_text=replace_text
-        )
-
+    # Results are always written to output_folder here
+    profile = "fast" if REDACTION_SAVE_PROFILE == "stream" else REDACTION_SAVE_PROFILE
+    for index, (_, output_path) in enumerate(iter_pdf_redaction(
+            input_files, output_folder, method, replace_text,
+            profile=profile)):
         # Add to list of processed files
         output_paths.append(output_path)
-
-        # Clean up the extracted text file
-        if os.path.exists(extracted_text_path):
-            os.remove(extracted_text_path)
+        if progress is not None:
+            progress(index, output_path)
 
     return output_paths
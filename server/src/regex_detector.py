@@ -0,0 +1,103 @@
+# regex_detector.py
+import re
+
+# Verhoeff checksum tables (dihedral group D5)
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+
+def verhoeff_valid(digits):
+    """True if the digit string carries a valid Verhoeff check digit"""
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+# (entity type, pattern, score). Scores follow the Presidio recognizers they
+# stand in for; a validator below can raise or reject a match.
+_PATTERNS = [
+    ("EMAIL_ADDRESS",
+     r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", 1.0),
+    # Aadhaar: 1234 5678 9012, 1234-5678-9012 or 123456789012
+    ("AADHAAR_IN", r"\b\d{4}[- ]?\d{4}[- ]?\d{4}\b", 0.85),
+    # Indian mobile and landline numbers, and (123) 456-7890 style numbers
+    ("PHONE_NUMBER",
+     r"(?<![\w+])(?:\+91[\s-]?|0)?[6-9]\d{4}[\s-]?\d{5}\b"
+     r"|(?<![\w+])\+91[\s-]?\d{2,4}[\s-]?\d{6,8}\b"
+     r"|\(\d{3}\)\s?\d{3}-\d{4}\b", 0.75),
+    # PAN: five letters (fourth is the holder type), four digits, a letter
+    ("IN_PAN", r"\b[A-Z]{3}[ABCFGHLJPT][A-Z]\d{4}[A-Z]\b", 0.85),
+    # Medical record numbers only count after a label; the label itself is
+    # not part of the entity
+    ("MEDICAL_RECORD_NUMBER",
+     r"\b(?:MRN|UHID|Medical\s+Record\s+(?:No\.?|Number|#))\s*[:#.-]?\s*"
+     r"(?P<MEDICAL_RECORD_NUMBER_value>[A-Z0-9][A-Z0-9-]{3,19})\b", 0.85),
+]
+
+# One alternation scanned once per text; the group that matched names the
+# entity type
+_COMBINED = re.compile("|".join(f"(?P<{entity_type}>{pattern})"
+                                for entity_type, pattern, _ in _PATTERNS))
+_SCORES = {entity_type: score for entity_type, _, score in _PATTERNS}
+
+ENTITY_TYPES = [entity_type for entity_type, _, _ in _PATTERNS]
+
+# Changes whenever a pattern or score does, for cache keys
+RULES_SIGNATURE = repr(_PATTERNS)
+
+
+def _validate(entity_type, value, score):
+    """Return the final score of a match, or None to reject it"""
+    if entity_type == "AADHAAR_IN":
+        digits = re.sub(r"\D", "", value)
+        # Aadhaar numbers never start with 0 or 1
+        if digits[0] in "01":
+            return None
+        # A valid checksum makes the match near-certain
+        return 1.0 if verhoeff_valid(digits) else score
+    return score
+
+
+def find_entities(text):
+    """
+    Find structured identifiers (emails, Aadhaar, phone numbers, PAN,
+    MRNs) with a single precompiled regex pass.
+
+    Returns:
+        List of (entity_type, start, end, score) in text order
+    """
+    entities = []
+    for match in _COMBINED.finditer(text):
+        entity_type = match.lastgroup
+        if entity_type is None:
+            continue
+        if entity_type == "MEDICAL_RECORD_NUMBER":
+            start, end = match.span("MEDICAL_RECORD_NUMBER_value")
+        else:
+            start, end = match.span()
+
+        score = _validate(entity_type, text[start:end], _SCORES[entity_type])
+        if score is not None:
+            entities.append((entity_type, start, end, score))
+    return entities
@@ -0,0 +1,198 @@
+# structured_service.py
+import os
+from sqlalchemy import case, update
+from database.dbhandler import hash_file
+from database.models import Document
+from src.cache import DiskCache, digest
+from src.content_store import file_digest
+from src.config import (SYSTEM_PROMPT, OLLAMA_MODEL, STRUCTURED_CACHE_ENABLED,
+                        STRUCTURED_CACHE_DIR, STRUCTURED_CACHE_MAX_BYTES,
+                        STRUCTURED_CACHE_TTL)
+from src.ocr_redaction import ocr_from_pdf, OCR_FROM_PDF_SETTINGS
+from src.ocr_engine import get_engine
+from src.ollamahandler import OllamaClient
+from src.metrics import register_cache, BYTES_PROCESSED, DOCUMENTS_PROCESSED
+
+# PDF content digest -> OCR text
+ocr_text_cache = DiskCache(
+    os.path.join(STRUCTURED_CACHE_DIR, "ocr_text"),
+    STRUCTURED_CACHE_MAX_BYTES,
+    enabled=STRUCTURED_CACHE_ENABLED,
+    ttl=STRUCTURED_CACHE_TTL)
+
+# (OCR text digest, model, prompt digest) -> structured JSON
+structured_cache = DiskCache(
+    os.path.join(STRUCTURED_CACHE_DIR, "structured"),
+    STRUCTURED_CACHE_MAX_BYTES,
+    enabled=STRUCTURED_CACHE_ENABLED,
+    ttl=STRUCTURED_CACHE_TTL)
+
+# Start from an empty cache whenever the configured model or prompt changes
+structured_cache.ensure_version(digest(OLLAMA_MODEL, SYSTEM_PROMPT))
+
+register_cache("ocr_text", ocr_text_cache)
+register_cache("structured", structured_cache)
+
+
+def _ocr_text_key(pdf_digest):
+    return digest(pdf_digest, "ocr_from_pdf", OCR_FROM_PDF_SETTINGS,
+                  get_engine().name)
+
+
+def _structured_key(text, model):
+    return digest(digest(text), model, digest(SYSTEM_PROMPT))
+
+
+def invalidate_structured_cache():
+    """Drop every cached OCR text and structured result"""
+    ocr_text_cache.clear()
+    structured_cache.clear()
+
+
+# Paths per IN (...) list, well under every backend's bound-parameter limit
+_PATHS_PER_QUERY = 500
+
+
+def _load_documents(db, document_paths):
+    """(path, email) of the stored documents among document_paths, by path"""
+    paths = list(dict.fromkeys(document_paths))
+    documents = {}
+    for start in range(0, len(paths), _PATHS_PER_QUERY):
+        chunk = paths[start:start + _PATHS_PER_QUERY]
+        for row in db.query(Document.path, Document.email).filter(
+                Document.path.in_(chunk)):
+            documents[row.path] = row
+    return documents
+
+
+def _update_hashes(db, hashes):
+    """Set documents.hash from a {path: hash} dict in one UPDATE per chunk"""
+    items = list(hashes.items())
+    for start in range(0, len(items), _PATHS_PER_QUERY):
+        chunk = dict(items[start:start + _PATHS_PER_QUERY])
+        db.execute(update(Document)
+                   .where(Document.path.in_(list(chunk)))
+                   .values(hash=case(chunk, value=Document.path))
+                   .execution_options(synchronize_session=False))
+
+
+def process_structured_documents(document_paths, db, client=None,
+                                 progress=None):
+    """
+    Extract structured data from stored documents and update their hashes
+
+    Documents are sent to the model concurrently (see
+    OllamaClient.iter_structured_data) while the next ones are OCR'd.
+    Documents whose bytes were processed before with the same model and
+    prompt are answered from the structured cache. The stored documents
+    are loaded with one IN (...) query and their hashes written with one
+    UPDATE (per 500 paths).
+
+    Parameters:
+        document_paths: List of document paths as stored in the database
+        db: Database session; the caller commits the hash updates
+        client: OllamaClient to use, a new one is created if omitted
+        progress: Optional callback progress(index, result) called as each
+                  document finishes, in completion order
+
+    Returns:
+        List of per-document result dicts (structured data or error), in
+        the order of document_paths
+    """
+    if client is None:
+        client = OllamaClient()
+    results = [None] * len(document_paths)
+    stored = _load_documents(db, document_paths)
+    documents = {}
+    hashes = {}
+    pdf_digests = {}
+    texts = {}
+
+    def finish(index, structured_result):
+        doc_path = document_paths[index]
+        document = documents[index]
+
+        # Calculate hash for the structured data
+        doc_hash = hash_file(structured_result)
+
+        # Written to the database in one go once every document is done
+        hashes[doc_path] = doc_hash
+        DOCUMENTS_PROCESSED.inc(operation="structured")
+
+        # Add document info to results
+        results[index] = {
+            'structured_data': structured_result,
+            'hash': doc_hash,
+            'path': doc_path,
+            'filename': os.path.basename(doc_path),
+            'email': document.email
+        }
+        if progress is not None:
+            progress(index, results[index])
+
+    pending = []
+    for index, doc_path in enumerate(document_paths):
+        # Loaded from the database above
+        document = stored.get(doc_path)
+
+        if not document:
+            results[index] = {
+                'error': f'Document with path {doc_path} not found',
+                'path': doc_path
+            }
+        elif not os.path.exists(doc_path):
+            results[index] = {
+                'error': f'File not found at path {doc_path}',
+                'path': doc_path
+            }
+        else:
+            documents[index] = document
+            pdf_digests[index] = file_digest(doc_path)
+            BYTES_PROCESSED.inc(os.path.getsize(doc_path), direction="in")
+
+            # Seen before: OCR text and structured output are both cached
+            cached_text = ocr_text_cache.get(
+                _ocr_text_key(pdf_digests[index]))
+            if cached_text is not None:
+                texts[index] = cached_text.decode('utf-8')
+                cached = structured_cache.get_json(
+                    _structured_key(texts[index], client.model))
+                if cached is not None:
+                    finish(index, cached)
+                    continue
+
+            pending.append(index)
+            continue
+
+        if progress is not None:
+            progress(index, results[index])
+
+    # Process documents to get text; consumed lazily by the client so OCR
+    # overlaps with model requests
+    def ocr_texts():
+        for index in pending:
+            if index not in texts:
+                texts[index] = ocr_from_pdf(document_paths[index])
+                ocr_text_cache.set(_ocr_text_key(pdf_digests[index]),
+                                   texts[index].encode('utf-8'))
+            yield texts[index]
+
+    for position, structured_result, error in client.iter_structured_data(ocr_texts()):
+        index = pending[position]
+
+        if error is not None:
+            results[index] = {
+                'error': f'Structured extraction failed: {error}',
+                'path': document_paths[index]
+            }
+            if progress is not None:
+                progress(index, results[index])
+            continue
+
+        if structured_result is not None:
+            structured_cache.set_json(
+                _structured_key(texts[index], client.model), structured_result)
+        finish(index, structured_result)
+
+    _update_hashes(db, hashes)
+    return results
@@ -0,0 +1,160 @@
+# term_matcher.py
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+# Spaces, dashes, dots and slashes between two digits: "1234 5678 9012",
+# "1234-5678-9012" and "123456789012" are the same number
+_DIGIT_SEPARATORS = re.compile(r"(?<=\d)[ .\-/]+(?=\d)")
+# Joins words of different blocks; no normalized term contains it
+_BLOCK_BREAK = "\n"
+
+
+def normalize_term(term):
+    """
+    Lowercase, collapse whitespace so terms match across line breaks, and
+    drop separators inside numbers
+    """
+    term = _WHITESPACE.sub(" ", term).strip().lower()
+    return _DIGIT_SEPARATORS.sub("", term)
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over a set of PII terms.
+
+    The automaton is built once per document and finds every occurrence of
+    every term in a single left-to-right scan, instead of one search per
+    term. Matching is case-insensitive, treats any run of whitespace as
+    a single space and ignores separators between digits.
+    """
+
+    def __init__(self, terms):
+        self.terms = sorted({normalize_term(t) for t in terms if t and t.strip()})
+
+        # goto[state] maps a character to the next state
+        self._goto = [{}]
+        self._fail = [0]
+        # Lengths of the terms that end at each state
+        self._output = [[]]
+
+        for term in self.terms:
+            self._add(term)
+        self._build_failure_links()
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def _add(self, term):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(term))
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                if fail == next_state:
+                    fail = 0
+
+                self._fail[next_state] = fail
+                self._output[next_state] = self._output[next_state] + \
+                    self._output[fail]
+
+    def find_all(self, text):
+        """
+        Yield (start, end) character spans of every term occurrence in an
+        already normalized text, including overlapping ones.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in output[state]:
+                yield i + 1 - length, i + 1
+
+    def match_words(self, words, groups=None):
+        """
+        Match terms against a sequence of words.
+
+        The words are joined with single spaces and scanned once; each match
+        is mapped back to the words it touches. A term found inside a word
+        selects the whole word, except that a term starting or ending with
+        a digit never matches next to another digit.
+
+        Parameters:
+            words: Sequence of word strings
+            groups: Optional sequence with a key per word (e.g. its text
+                    block); terms never match across a change of key
+
+        Returns:
+            List of (first, last) word index spans, inclusive.
+        """
+        if not self.terms:
+            return []
+
+        # Joined text and the index of the word each character belongs to
+        parts = []
+        owners = []
+        group = None
+        for index, word in enumerate(words):
+            word = _WHITESPACE.sub(" ", word).strip().lower()
+            if not word:
+                continue
+            if parts:
+                if groups is not None and groups[index] != group:
+                    parts.append(_BLOCK_BREAK)
+                else:
+                    parts.append(" ")
+                owners.append(index)
+            if groups is not None:
+                group = groups[index]
+            parts.append(word)
+            owners.extend([index] * len(word))
+        text = "".join(parts)
+
+        # Drop digit separators from the text as from the terms, keeping
+        # the owners of the remaining characters
+        if _DIGIT_SEPARATORS.search(text):
+            kept_parts = []
+            kept_owners = []
+            position = 0
+            for match in _DIGIT_SEPARATORS.finditer(text):
+                kept_parts.append(text[position:match.start()])
+                kept_owners.extend(owners[position:match.start()])
+                position = match.end()
+            kept_parts.append(text[position:])
+            kept_owners.extend(owners[position:])
+            text = "".join(kept_parts)
+            owners = kept_owners
+
+        spans = set()
+        for start, end in self.find_all(text):
+            # A number only matches as a whole: with separators dropped,
+            # "1234 5678 9012" would otherwise match inside
+            # "11234-5678-90123"
+            if start > 0 and text[start].isdigit() and text[start - 1].isdigit():
+                continue
+            if end < len(text) and text[end - 1].isdigit() and text[end].isdigit():
+                continue
+            spans.add((owners[start], owners[end - 1]))
+
+        return sorted(spans)
@@ -0,0 +1,72 @@
+# text_chunks.py
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+
+# Section headers written by ExtractedDocument.text and ocr_from_pdf
+PAGE_MARKER = re.compile(r"^--- (?:Image OCR on )?Page (\d+) ---$", re.MULTILINE)
+
+# Preferred places to end a chunk, best first
+_BOUNDARIES = ("\n--- ", "\n\n", "\n", " ")
+
+
+@dataclass(frozen=True)
+class TextChunk:
+    """A [start, end) slice of a document text and the pages it covers"""
+    start: int
+    end: int
+    pages: tuple
+
+
+def _cut_before(text, lo, hi):
+    """Best split point in text[lo:hi]: just after a page, paragraph or line break"""
+    for boundary in _BOUNDARIES:
+        index = text.rfind(boundary, lo, hi)
+        if index != -1:
+            return index + 1
+    return hi
+
+
+def page_offsets(text):
+    """(offset, page number) of every page header in text"""
+    return [(match.start(), int(match.group(1)))
+            for match in PAGE_MARKER.finditer(text)]
+
+
+def split_text(text, max_chars, overlap):
+    """
+    Split text into chunks of at most max_chars characters.
+
+    Chunks end on page, paragraph or line boundaries where possible, and
+    each chunk starts up to overlap characters before the previous one
+    ended (at a line start), so an entity cut by one split is whole in
+    the next chunk.
+
+    Returns:
+        List of TextChunk covering the whole text, in order.
+    """
+    overlap = min(overlap, max_chars // 4)
+    offsets = page_offsets(text)
+    starts = [offset for offset, _ in offsets]
+
+    def pages(start, end):
+        first = bisect_right(starts, start) - 1
+        last = bisect_right(starts, end - 1) - 1
+        return tuple(offsets[i][1] for i in range(max(first, 0), last + 1))
+
+    if len(text) <= max_chars:
+        return [TextChunk(0, len(text), pages(0, len(text)))]
+
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            end = _cut_before(text, start + max_chars // 2, end)
+        chunks.append(TextChunk(start, end, pages(start, end)))
+        if end >= len(text):
+            return chunks
+
+        next_start = end - overlap
+        newline = text.find("\n", next_start, end - 1)
+        start = newline + 1 if newline != -1 else next_start
@@ -0,0 +1,151 @@
+# text_detector.py
+import cv2
+import numpy as np
+
+# Detection runs on a copy downscaled to at most this many pixels per side
+DETECT_MAX_SIDE = 1200
+# Gradient strength (0-255) below which a pixel is not a stroke edge;
+# keeps paper texture and JPEG noise out of the edge map
+MIN_EDGE_STRENGTH = 40
+# Images with fewer edge pixels than this fraction are treated as blank
+MIN_EDGE_DENSITY = 0.002
+# Above this fraction of the image covered by candidate regions, OCR the
+# whole image instead of the crops
+MAX_REGION_COVERAGE = 0.6
+# Every crop is a separate Tesseract call; past this many regions a single
+# crop around all of them is cheaper
+MAX_REGIONS = 6
+
+
+def _to_gray(image):
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _edge_map(gray):
+    """Binary map of stroke edges, independent of text/background polarity"""
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT,
+                                np.ones((3, 3), np.uint8))
+    otsu, _ = cv2.threshold(gradient, 0, 255,
+                            cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    _, edges = cv2.threshold(gradient, max(otsu, MIN_EDGE_STRENGTH), 255,
+                             cv2.THRESH_BINARY)
+    return edges
+
+
+def _text_like_boxes(edges):
+    """
+    Boxes of connected components shaped like runs of characters: close
+    the gaps between letters horizontally, then keep components with a
+    text-line height and a moderate stroke density.
+    """
+    height, width = edges.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3))
+    joined = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+    boxes = []
+    for x, y, w, h, area in stats[1:count]:
+        if h < 5 or h > height * 0.5:
+            continue
+        if w < 6 or w < h * 0.5:
+            continue
+        # Solid blobs (photos, filled shapes) and stray specks are not text
+        density = np.count_nonzero(edges[y:y + h, x:x + w]) / float(w * h)
+        if density < 0.08 or density > 0.9:
+            continue
+        boxes.append((x, y, w, h))
+    return boxes
+
+
+def _merge_boxes(boxes, shape):
+    """
+    Merge character-run boxes into text blocks: words on a line and
+    neighbouring lines join, gaps scale with the typical text height
+    """
+    line_height = int(np.median([h for _, _, _, h in boxes]))
+    gap_x = max(2 * line_height, 6)
+    gap_y = max(line_height // 2, 3)
+
+    mask = np.zeros(shape, np.uint8)
+    for x, y, w, h in boxes:
+        mask[y:y + h, x:x + w] = 255
+    mask = cv2.dilate(mask, cv2.getStructuringElement(
+        cv2.MORPH_RECT, (2 * gap_x + 1, 2 * gap_y + 1)))
+
+    count, labels = cv2.connectedComponents(mask, connectivity=8)
+    # Bounding box of the original boxes in each merged component, so the
+    # dilation does not grow the regions
+    merged = {}
+    for x, y, w, h in boxes:
+        label = labels[y + h // 2, x + w // 2]
+        x0, y0, x1, y1 = merged.get(label, (x, y, x + w, y + h))
+        merged[label] = (min(x0, x), min(y0, y), max(x1, x + w), max(y1, y + h))
+
+    return [(x0, y0, x1 - x0, y1 - y0)
+            for x0, y0, x1, y1 in merged.values()], line_height
+
+
+def find_text_regions(image, pad=8):
+    """
+    Cheaply estimate where an image may contain text.
+
+    Uses edge density and connected-component statistics on a downscaled
+    grayscale copy. Errs on the side of reporting text, since a region
+    missed here is never OCR'd.
+
+    Parameters:
+        image: OpenCV image (BGR, BGRA or grayscale)
+        pad: Minimum margin in full-resolution pixels added around each
+             region
+
+    Returns:
+        List of (x, y, w, h) regions in full-resolution pixels. An empty
+        list means the image very likely has no text; a single region
+        covering the whole image means it should be OCR'd in full.
+    """
+    gray = _to_gray(image)
+    full_height, full_width = gray.shape
+    whole = [(0, 0, full_width, full_height)]
+    if full_height < 16 or full_width < 16:
+        return whole
+
+    scale = min(1.0, DETECT_MAX_SIDE / max(full_height, full_width))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA)
+
+    edges = _edge_map(gray)
+    if np.count_nonzero(edges) < edges.size * MIN_EDGE_DENSITY:
+        return []
+
+    boxes = _text_like_boxes(edges)
+    if not boxes:
+        return []
+
+    merged, line_height = _merge_boxes(boxes, gray.shape)
+    if len(merged) > MAX_REGIONS:
+        x0 = min(x for x, _, _, _ in merged)
+        y0 = min(y for _, y, _, _ in merged)
+        x1 = max(x + w for x, _, w, _ in merged)
+        y1 = max(y + h for _, y, _, h in merged)
+        merged = [(x0, y0, x1 - x0, y1 - y0)]
+
+    # Tesseract needs a margin around the text; half a line at least
+    pad = max(pad, int(line_height / scale / 2))
+    regions = []
+    covered = 0
+    for x, y, w, h in merged:
+        x0 = max(int(x / scale) - pad, 0)
+        y0 = max(int(y / scale) - pad, 0)
+        x1 = min(int((x + w) / scale) + pad, full_width)
+        y1 = min(int((y + h) / scale) + pad, full_height)
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+        covered += (x1 - x0) * (y1 - y0)
+
+    if covered > full_width * full_height * MAX_REGION_COVERAGE:
+        return whole
+    return regions
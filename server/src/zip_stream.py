@@ -0,0 +1,80 @@
+# zip_stream.py
+import io
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Write-only, non-seekable file object for zipfile. Written bytes are
+    held only until the next drain(), so memory use is bounded by a chunk
+    rather than by the archive size.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, on_added=None):
+    """
+    Build a ZIP archive incrementally.
+
+    Parameters:
+        entries: Iterable of (arcname, source) pairs, where source is a
+                 file path or the member's bytes; it may be a generator
+                 that produces files while the archive is being streamed
+        on_added: Optional callback on_added(path) run once a file (not
+                  in-memory bytes) has been written to the archive, e.g.
+                  to delete it
+
+    Yields:
+        Chunks of the archive as bytes
+    """
+    sink = _StreamSink()
+    # A non-seekable target makes zipfile write sizes in data descriptors
+    # after each member instead of seeking back to the local header. Members
+    # are deflated: streaming unzippers (e.g. Java's ZipInputStream) find
+    # the end of a deflated member without its size, but cannot read a
+    # stored one. PDFs are mostly compressed already, so level 1 is enough.
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED,
+                         compresslevel=1) as zf:
+        for arcname, source in entries:
+            in_memory = isinstance(source, (bytes, bytearray, memoryview))
+            if in_memory:
+                src = io.BytesIO(source)
+            else:
+                src = open(source, 'rb')
+
+            with src, zf.open(arcname, 'w') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+            if on_added is not None and not in_memory:
+                on_added(source)
+
+    # Central directory
+    data = sink.drain()
+    if data:
+        yield data
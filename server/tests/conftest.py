@@ -0,0 +1,19 @@
+# conftest.py
+"""
+Tests run against an in-memory SQLite database. The app creates its upload,
+storage, job and cache folders relative to the working directory when it
+is imported, so the environment and working directory are set up here,
+before any test module imports it.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="server-tests-")
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ANALYZER_PRELOAD", "0")
+os.environ["OCR_CACHE_DIR"] = os.path.join(_workdir, "cache", "ocr")
+os.environ["REDACTION_CACHE_DIR"] = os.path.join(_workdir, "cache", "redaction")
+os.environ["STRUCTURED_CACHE_DIR"] = os.path.join(_workdir, "cache", "structured")
+os.environ["JOB_STORAGE_FOLDER"] = os.path.join(_workdir, "job_storage")
+os.chdir(_workdir)
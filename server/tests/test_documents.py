@@ -0,0 +1,165 @@
+# test_documents.py
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import app, encode_cursor
+from database.migrations import migrate
+from database.models import Base, Document, SessionLocal
+
+
+def _add_documents(*documents):
+    db = SessionLocal()
+    try:
+        for path, created_at, fields in documents:
+            db.add(Document(path=path, created_at=created_at,
+                            email=fields.get("email", "a@example.com"),
+                            hash=fields.get("hash"),
+                            content_hash=fields.get("content_hash")))
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client():
+    db = SessionLocal()
+    db.query(Document).delete()
+    db.commit()
+    db.close()
+    with app.test_client() as client:
+        yield client
+
+
+def _walk(client, query):
+    """Every page of /documents?<query>, following X-Next-Cursor"""
+    pages = []
+    response = client.get(f"/documents?{query}")
+    while True:
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        response = client.get(f"/documents?{query}&cursor={cursor}")
+
+
+def test_migrate_legacy_documents_table():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE documents (path VARCHAR PRIMARY KEY, "
+            "hash VARCHAR, email VARCHAR NOT NULL)")
+        conn.exec_driver_sql(
+            "INSERT INTO documents (path, hash, email) VALUES "
+            "('b.pdf', NULL, 'a@example.com'), ('a.pdf', 'h', 'b@example.com')")
+
+    # As database.models.create_tables: new tables first, then migrations
+    Base.metadata.create_all(engine)
+    assert migrate(engine, Base.metadata) == [1, 2]
+
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("documents")}
+    assert {"created_at", "content_hash"} <= columns
+    indexes = {index["name"] for index in inspector.get_indexes("documents")}
+    assert indexes >= {"ix_documents_email_created_at", "ix_documents_created_at",
+                       "ix_documents_hash", "ix_documents_content_hash"}
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT path, created_at FROM documents ORDER BY path")).all()
+    assert [row.path for row in rows] == ["a.pdf", "b.pdf"]
+    assert all(row.created_at.startswith("1970-01-01") for row in rows)
+
+    # Already applied migrations are not run again
+    assert migrate(engine, Base.metadata) == []
+
+
+def test_documents_without_limit_returns_everything(client):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    _add_documents(*[(f"doc{i:03}.pdf", created_at, {}) for i in range(150)])
+
+    response = client.get("/documents")
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 150
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_cursor_walk_returns_each_document_once(client):
+    tied = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    later = datetime(2025, 1, 2, tzinfo=timezone.utc)
+    _add_documents(("d.pdf", later, {}),
+                   ("c.pdf", tied, {}),
+                   ("a.pdf", tied, {}),
+                   ("e.pdf", tied, {"email": "other@example.com"}),
+                   ("b.pdf", tied, {}))
+
+    pages = _walk(client, "limit=2&fields=path")
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    paths = [document["path"] for page in pages for document in page]
+    assert paths == ["a.pdf", "b.pdf", "c.pdf", "e.pdf", "d.pdf"]
+
+    pages = _walk(client, "limit=1&fields=path&email=a@example.com")
+    paths = [document["path"] for page in pages for document in page]
+    assert paths == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+
+
+def test_fields_selects_columns(client):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    _add_documents(("store/x.pdf", created_at,
+                    {"hash": "h1", "content_hash": "c1"}))
+
+    response = client.get("/documents?fields=filename,content_hash,processed")
+
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"filename": "x.pdf", "content_hash": "c1", "processed": True}]
+
+    response = client.get("/documents")
+    assert set(response.get_json()[0]) == {
+        "path", "email", "hash", "filename", "processed"}
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get("/documents?fields=path,secret")
+
+    assert response.status_code == 400
+    assert "secret" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    # A JSON list of the wrong length
+    "WyJ4Il0",
+    # A valid cursor cut short
+    encode_cursor(datetime(2025, 1, 1, tzinfo=timezone.utc), "a.pdf")[:-3],
+])
+def test_bad_cursor_is_rejected(client, cursor):
+    response = client.get(f"/documents?cursor={cursor}")
+
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.get_json()["error"]
+
+
+def test_bad_limit_is_rejected(client):
+    response = client.get("/documents?limit=ten")
+
+    assert response.status_code == 400
+
+
+def test_document_by_hash(client, tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    _add_documents((str(path), created_at, {"hash": "abc"}))
+
+    response = client.get("/document/hash/abc")
+
+    assert response.status_code == 200
+    assert response.data == b"%PDF-1.4 test"
+    assert response.mimetype == "application/pdf"
+
+    assert client.get("/document/hash/missing").status_code == 404
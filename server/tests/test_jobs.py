@@ -0,0 +1,77 @@
+# test_jobs.py
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.models import Job, SessionLocal
+from src.jobs import JobManager, QUEUED, RUNNING
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    db = SessionLocal()
+    db.query(Job).delete()
+    db.commit()
+    db.close()
+
+    manager = JobManager(str(tmp_path), max_workers=1,
+                         heartbeat_timeout=60)
+    # Record what would run instead of running it on the pool
+    manager.submitted = []
+    monkeypatch.setattr(manager._executor, "submit",
+                        lambda function, *args: manager.submitted.append(args))
+    return manager
+
+
+def _add_job(job_id, status, owner=None, heartbeat_at=None):
+    progress = {'total': 1, 'completed': 1,
+                'files': [{'name': 'a.pdf', 'status': RUNNING}]}
+    db = SessionLocal()
+    try:
+        db.add(Job(id=job_id, kind='redact', status=status, owner=owner,
+                   heartbeat_at=heartbeat_at, params='{}',
+                   progress=json.dumps(progress)))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _job(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+
+def test_claim_only_succeeds_once(manager):
+    _add_job('job', QUEUED)
+
+    assert manager._claim('job')
+    assert not manager._claim('job')
+    assert not manager._claim('missing')
+
+    job = _job('job')
+    assert job.status == RUNNING
+    assert job.owner == manager.owner
+    assert job.heartbeat_at is not None
+
+
+def test_recover_keeps_jobs_of_live_processes(manager):
+    now = datetime.now(timezone.utc)
+    _add_job('queued', QUEUED)
+    _add_job('alive', RUNNING, owner='other:1', heartbeat_at=now)
+    _add_job('stale', RUNNING, owner='other:2',
+             heartbeat_at=now - timedelta(minutes=5))
+    _add_job('unowned', RUNNING)
+
+    recovered = manager.recover()
+
+    assert sorted(recovered) == ['queued', 'stale', 'unowned']
+    assert sorted(job_id for job_id, _ in manager.submitted) == sorted(recovered)
+    assert _job('alive').status == RUNNING
+    stale = _job('stale')
+    assert stale.status == QUEUED
+    assert stale.owner is None
+    assert json.loads(stale.progress)['files'][0]['status'] == QUEUED
@@ -0,0 +1,46 @@
+# test_ocr_redaction.py
+import fitz
+import pytest
+
+from src.ocr_redaction import _replace_image
+
+
+def _image_pdf(inherit_resources):
+    """
+    One page with a light grey image and a line of text; with
+    inherit_resources the page's /Resources is moved to the Pages node
+    """
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=200)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(200)
+    page.insert_image(fitz.Rect(10, 10, 110, 110), pixmap=pixmap)
+    page.insert_text((10, 150), "Hello", fontname="helv")
+
+    if inherit_resources:
+        resources = doc.xref_get_key(page.xref, "Resources")[1]
+        pages = int(doc.xref_get_key(doc.pdf_catalog(), "Pages")[1].split()[0])
+        doc.xref_set_key(pages, "Resources", resources)
+        doc.xref_set_key(page.xref, "Resources", "null")
+    return fitz.open("pdf", doc.tobytes())
+
+
+@pytest.mark.parametrize("inherit_resources", [False, True])
+def test_replace_image_keeps_page_resources(inherit_resources):
+    doc = _image_pdf(inherit_resources)
+    page = doc[0]
+    black = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    black.clear_with(0)
+
+    _replace_image(page, page.get_images()[0][0], black.tobytes("png"))
+
+    saved = fitz.open("pdf", doc.tobytes(garbage=1))
+    page = saved[0]
+    images = page.get_images(full=True)
+    assert images
+    assert fitz.Pixmap(saved, images[0][0]).pixel(0, 0) == (0, 0, 0)
+    assert [font[3] for font in page.get_fonts()] == ["Helvetica"]
+    assert "Hello" in page.get_text()
+    if not inherit_resources:
+        # The copy replace_image adds is no longer referenced
+        assert len(images) == 1
@@ -0,0 +1,52 @@
+# test_ollamahandler.py
+import pytest
+
+from src.ollamahandler import OllamaClient
+
+
+class _Stream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for content in self.chunks:
+            self.read += 1
+            yield {'message': {'content': content}}
+
+    def close(self):
+        self.closed = True
+
+
+class _Client:
+    def __init__(self, chunks):
+        self.stream = _Stream(chunks)
+
+    def chat(self, **kwargs):
+        return self.stream
+
+
+def _prompt(format, chunks):
+    client = OllamaClient(format=format)
+    client.client = _Client(chunks)
+    output = client.prompt_model(client.new_conversation("report"))
+    return output, client.client.stream
+
+
+def test_constrained_output_stops_after_the_json_value():
+    output, stream = _prompt("json", ['{"a": [1', ', 2]}', ' trailing', ' text'])
+
+    assert output == '{"a": [1, 2]}'
+    assert stream.read == 2
+    assert stream.closed
+
+
+@pytest.mark.parametrize("format", ["", None])
+def test_unconstrained_output_is_read_to_the_end(format):
+    chunks = ['Here is the [report] ', '{"name": ', '"x"}', ' Done.']
+
+    output, stream = _prompt(format, chunks)
+
+    assert output == "".join(chunks)
+    assert stream.read == len(chunks)
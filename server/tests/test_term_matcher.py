@@ -0,0 +1,41 @@
+# test_term_matcher.py
+import pytest
+
+from src.term_matcher import TermMatcher
+
+
+@pytest.mark.parametrize("words, spans", [
+    (["1234", "5678", "9012"], [(0, 2)]),
+    (["id:", "1234-5678-9012."], [(1, 1)]),
+    (["123456789012"], [(0, 0)]),
+    (["12", "34", "5678", "9012"], [(0, 3)]),
+])
+def test_digit_groups_match_across_separators(words, spans):
+    matcher = TermMatcher(["1234 5678 9012"])
+
+    assert matcher.match_words(words) == spans
+
+
+@pytest.mark.parametrize("words", [
+    ["11234-5678-90123"],
+    ["11234", "5678", "9012"],
+    ["1234", "5678", "90123"],
+    ["91234567890129"],
+])
+def test_digit_groups_do_not_match_inside_longer_numbers(words):
+    matcher = TermMatcher(["1234 5678 9012"])
+
+    assert matcher.match_words(words) == []
+
+
+def test_terms_do_not_match_across_groups():
+    matcher = TermMatcher(["John Smith"])
+    words = ["John", "Smith", "John", "Smith"]
+
+    assert matcher.match_words(words, groups=[1, 1, 2, 3]) == [(0, 1)]
+
+
+def test_terms_inside_words_select_the_word():
+    matcher = TermMatcher(["smith"])
+
+    assert matcher.match_words(["Mr.", "SMITH's"]) == [(1, 1)]
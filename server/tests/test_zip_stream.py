@@ -0,0 +1,33 @@
+# test_zip_stream.py
+import io
+import struct
+import zipfile
+
+from src.zip_stream import stream_zip
+
+
+def test_members_are_deflated_for_streaming_readers(tmp_path):
+    path = tmp_path / "b.pdf"
+    path.write_bytes(b"%PDF-1.4 file" * 1000)
+    added = []
+
+    archive = b"".join(stream_zip(
+        [("a.pdf", b"%PDF-1.4 bytes"), ("b.pdf", str(path))],
+        on_added=added.append))
+
+    assert added == [str(path)]
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.read("a.pdf") == b"%PDF-1.4 bytes"
+        assert zf.read("b.pdf") == path.read_bytes()
+        for info in zf.infolist():
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+
+    # Local file headers: sizes follow in a data descriptor (flag 0x08),
+    # which streaming readers only accept for deflated members
+    offset = 0
+    while archive[offset:offset + 4] == b"PK\x03\x04":
+        flags, method = struct.unpack("<HH", archive[offset + 6:offset + 10])
+        assert flags & 0x08
+        assert method == zipfile.ZIP_DEFLATED
+        offset = archive.index(b"PK\x07\x08", offset) + 16
+    assert offset > 0